@@ -1,106 +1,404 @@
 # agent.py
 import os
+import sys
+import time
+import argparse
 import subprocess
 import json
 import re
+import hashlib
+import asyncio
+import tempfile
+import traceback
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any, List
-from openai import OpenAI
-from langgraph.graph import StateGraph, END
+from typing import TYPE_CHECKING, Dict, Any, List, TypedDict
+from llm_cache import cache as llm_cache
+import replay
+from impact import affected_tests
+import test_worker
+import sharding
+from test_results import TestRun, parse_junit
+import compaction
+from streaming import compact_bounded, run_streaming
+from failure_memo import failure_signature, signature_parts, memo as failure_memo
+from context_builder import build_context, estimate_tokens
+from symbol_index import get_symbol_index
+from patching import PatchError, apply_diff
+from sandbox import sandbox
+import workspace
+from workspace import get_workspace
+import tracing
+from rate_limiter import (limiter, call_with_limits, call_with_limits_async,
+                          PRIORITY_FIX, PRIORITY_CODE, PRIORITY_ANALYSIS, PRIORITY_SUMMARY)
+from tracing import span, traced_node
+
+# openai and langgraph take over a second to import; they are loaded on first
+# use so the CLI menu and --help come up immediately.
+if TYPE_CHECKING:
+    from openai import OpenAI, AsyncOpenAI
 
 # -----------------------
 # Config
 # -----------------------
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    base_url=os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
-)
+_client = None
+_graph = None
+
+# One async client per event loop: the httpx pool behind it is bound to the
+# loop it was created on, and every graph invocation runs in its own loop.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
 
 MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
-PROJECTS_DIR = Path("projects")
+TEMPERATURE = 0.2
+PROJECTS_DIR = Path(os.getenv("AGENT_PROJECTS_DIR", "projects"))
 MAX_ITERATIONS = int(os.getenv("MAX_AGENT_ITERS", 5))
+FAILURE_CONTEXT_BUDGET = int(os.getenv("FAILURE_CONTEXT_BUDGET", 2000))
+EDIT_FORMAT = os.getenv("EDIT_FORMAT", "diff")  # "diff" or "full"
+# "fused" derives requirements and plan in one JSON call instead of two round trips.
+PLAN_MODE = os.getenv("PLAN_MODE", "separate")  # "separate" or "fused"
+FIX_CANDIDATES = int(os.getenv("FIX_CANDIDATES", 1))
+CANDIDATE_TEMPERATURE = float(os.getenv("CANDIDATE_TEMPERATURE", 0.7))
+# Stop iterating once validation has returned the same failure signature this often.
+MAX_SIGNATURE_REPEATS = int(os.getenv("MAX_SIGNATURE_REPEATS", 2))
+CACHE_TEST_RUNS = os.getenv("CACHE_TEST_RUNS", "1") != "0"
+IMPACT_TESTS = os.getenv("IMPACT_TESTS", "0") == "1"
+WARM_TEST_WORKER = os.getenv("WARM_TEST_WORKER", "0") == "1"
+# Split a python suite over this many pytest processes, balanced by recorded test durations.
+TEST_SHARDS = int(os.getenv("TEST_SHARDS", 1))
+# Graph state is saved after every node, one thread per project, so --resume
+# can pick up where an interrupted run stopped.
+CHECKPOINT_DB = Path(os.getenv("AGENT_CHECKPOINT_DB", ".agent_cache/checkpoints.sqlite"))
+CHECKPOINTS = os.getenv("AGENT_CHECKPOINTS", "1") != "0"
+# Per-project wall times of the last serial run, the baseline for --jobs speedups.
+SERIAL_TIMINGS = Path(os.getenv("AGENT_SERIAL_TIMINGS", ".agent_runs/serial-timings.json"))
+
+# Files besides sources that change what the test run does.
+TEST_CONFIG_FILES = ["pytest.ini", "setup.cfg", "pyproject.toml", "tox.ini", "requirements.txt",
+                     "package.json", "package-lock.json", "pom.xml"]
 
 # -----------------------
 # Utilities
 # -----------------------
 def detect_language(project: Path) -> str:
-    if (project / "package.json").exists():
-        return "node"
-    elif (project / "pom.xml").exists():
-        return "java"
-    elif any(project.glob("*.py")) or (project / "requirements.txt").exists():
-        return "python"
-    else:
-        return "unknown"
-
-def run_tests(project: Path) -> str:
+    return get_workspace(project).language()
+
+# project -> {relative path: ((mtime_ns, size), sha256)}
+_file_digests: Dict[Path, Dict[str, tuple]] = {}
+# project -> (tree hash, test output, file digests at that run)
+_test_results: Dict[Path, tuple] = {}
+
+def tree_hash(project: Path) -> str:
+    # Only files whose mtime or size changed since the last call are re-read.
+    key = project.resolve()
+    known = _file_digests.get(key, {})
+    files = set(get_source_files(project))
+    files.update(project / name for name in TEST_CONFIG_FILES if (project / name).is_file())
+    current = {}
+    h = hashlib.sha256()
+    for f in sorted(files):
+        rel = str(f.relative_to(project))
+        try:
+            st = f.stat()
+        except OSError:
+            continue
+        sig = (st.st_mtime_ns, st.st_size)
+        entry = known.get(rel)
+        if entry is None or entry[0] != sig:
+            entry = (sig, hashlib.sha256(f.read_bytes()).hexdigest())
+        current[rel] = entry
+        h.update(f"{rel}\0{entry[1]}\n".encode("utf-8"))
+    _file_digests[key] = current
+    return h.hexdigest()
+
+def run_tests(project: Path) -> TestRun:
+    key = project.resolve()
+    digest = tree_hash(project)
+    files = _file_digests[key]
+    previous = _test_results.get(key)
+    if CACHE_TEST_RUNS and previous and previous[0] == digest:
+        print(f"♻️ No changes in {project.name} since the last test run, reusing its results.")
+        return previous[1]
+    result = None
+    if IMPACT_TESTS and previous and detect_language(project) == "python":
+        result = run_affected_tests(project, previous[2], files)
+    if result is None:
+        result = _run_tests_uncached(project)
+    if not result.timed_out:
+        _test_results[key] = (digest, result, files)
+    return result
+
+def run_affected_tests(project: Path, before: Dict[str, tuple], after: Dict[str, tuple]):
+    # Run only the tests that can reach a changed module. A failing subset is
+    # returned straight away; a passing one still needs the full suite to confirm.
+    changed = [rel for rel in set(before) | set(after)
+               if (before.get(rel) or (None, None))[1] != (after.get(rel) or (None, None))[1]]
+    if not changed:
+        return None
+    selected = affected_tests(project, get_source_files(project), changed)
+    if not selected:
+        return None
+    print(f"🎯 Running {len(selected)} affected test file(s) in {project.name} first: {', '.join(selected)}")
+    result = _run_tests_uncached(project, selected)
+    if not result.passed:
+        return result
+    print("✅ Affected tests pass, confirming with the full suite...")
+    return None
+
+def _run_tests_uncached(project: Path, targets: List[str] = (), warm: bool = True) -> TestRun:
+    with span("subprocess", "run_tests", targets=len(targets)) as trace:
+        result = _run_test_command(project, targets, warm)
+        compacted_bytes = len(result.output.encode("utf-8"))
+        trace.update(exit_code=result.exit_code, cases=len(result.cases), timed_out=result.timed_out,
+                     output_bytes=result.output_bytes or compacted_bytes, compacted_bytes=compacted_bytes)
+        return result
+
+def _timed_out(run, start: float) -> TestRun:
+    # Keep what the runner printed before it was killed; it usually shows where it hung.
+    return TestRun(run.output, None, [], time.perf_counter() - start, timed_out=True, output_bytes=run.raw_bytes)
+
+def _run_test_command(project: Path, targets: List[str], warm: bool) -> TestRun:
     lang = detect_language(project)
+    start = time.perf_counter()
     try:
         if lang == "python":
-            proc = subprocess.run(["pytest", "-q"], cwd=project, capture_output=True, text=True, timeout=60)
+            with tempfile.TemporaryDirectory(prefix="agent-junit-") as tmp:
+                junit = Path(tmp) / "junit.xml"
+                args = ["-q", f"--junitxml={junit}", *targets]
+                reports = [junit]
+                result = test_worker.run_warm(project, args, timeout=60) if warm and WARM_TEST_WORKER else None
+                sharded = (sharding.run_shards(project, TEST_SHARDS, Path(tmp), targets, 60, label=project.name)
+                           if result is None and TEST_SHARDS > 1 else None)
+                if result is not None:
+                    raw_bytes = result.get("output_bytes") or len(result["output"].encode("utf-8"))
+                    output, exit_code = compact_bounded(result["output"], raw_bytes), result["exit_code"]
+                elif sharded is not None:
+                    if sharded.timed_out:
+                        return _timed_out(sharded, start)
+                    output, exit_code, raw_bytes, reports = (sharded.output, sharded.exit_code,
+                                                             sharded.raw_bytes, sharded.reports)
+                else:
+                    run = run_streaming([*sharding.PYTEST_COMMAND, *args], project, 60, label=project.name)
+                    if run.timed_out:
+                        return _timed_out(run, start)
+                    output, exit_code, raw_bytes = run.output, run.exit_code, run.raw_bytes
+                cases = parse_junit(reports, project)
+            if warm:
+                # warm=False is a best-of-N sandbox, whose path (and durations file) is thrown away.
+                sharding.record_durations(project, {c.nodeid: c.duration for c in cases})
+            return TestRun(output, exit_code, cases, time.perf_counter() - start, output_bytes=raw_bytes)
         elif lang == "node":
-            proc = subprocess.run(["npm", "test"], cwd=project, capture_output=True, text=True, timeout=60)
+            run = run_streaming(["npm", "test"], project, 60, label=project.name)
+            if run.timed_out:
+                return _timed_out(run, start)
+            return TestRun(run.output, run.exit_code, [], time.perf_counter() - start, output_bytes=run.raw_bytes)
         elif lang == "java":
-            proc = subprocess.run(["mvn", "test"], cwd=project, capture_output=True, text=True, timeout=120)
+            run = run_streaming(["mvn", "test"], project, 120, label=project.name)
+            if run.timed_out:
+                return _timed_out(run, start)
+            reports = [r for r in (project / "target" / "surefire-reports").glob("TEST-*.xml")
+                       if r.stat().st_mtime >= time.time() - (time.perf_counter() - start)]
+            return TestRun(run.output, run.exit_code, parse_junit(reports), time.perf_counter() - start,
+                           output_bytes=run.raw_bytes)
         else:
-            return "⚠️ Unknown language, cannot run tests."
-        return proc.stdout + proc.stderr
-    except subprocess.TimeoutExpired:
-        return "⏳ Tests timed out."
+            return TestRun("⚠️ Unknown language, cannot run tests.")
+    except (subprocess.TimeoutExpired, TimeoutError):
+        return TestRun("⏳ Tests timed out.", duration=time.perf_counter() - start, timed_out=True)
 
 def get_source_files(project: Path) -> List[Path]:
-    lang = detect_language(project)
-    if lang == "python":
-        return list(project.rglob("*.py"))
-    elif lang == "node":
-        return list(project.rglob("*.js"))
-    elif lang == "java":
-        return list(project.rglob("*.java"))
-    else:
-        return []
-
-def ask_llm(prompt: str) -> str:
-    resp = client.chat.completions.create(
-        model=MODEL,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2,
-    )
-    return resp.choices[0].message.content.strip()
+    return [project / rel for rel in get_workspace(project).source_files()]
+
+def record_usage(trace: Dict[str, Any], resp):
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        trace["prompt_tokens"] = usage.prompt_tokens
+        trace["completion_tokens"] = usage.completion_tokens
+
+def replayed_answer(temperature: float, prompt: str, variant: int, trace: Dict[str, Any]):
+    answer = replay.player.get(MODEL, temperature, prompt, variant) if replay.player else None
+    if answer is not None:
+        trace["replayed"] = True
+    return answer
+
+def record_answer(temperature: float, prompt: str, answer: str, variant: int = 0):
+    if replay.recorder:
+        replay.recorder.record(MODEL, temperature, prompt, answer, variant)
+
+def ask_llm(prompt: str, priority: int = PRIORITY_ANALYSIS) -> str:
+    with span("llm", "ask_llm", model=MODEL, prompt_bytes=len(prompt.encode("utf-8"))) as trace:
+        key = llm_cache.make_key(MODEL, TEMPERATURE, prompt)
+        answer = replayed_answer(TEMPERATURE, prompt, 0, trace)
+        if answer is not None:
+            return answer
+        cached = llm_cache.get(key)
+        trace["cache_hit"] = cached is not None
+        if cached is not None:
+            record_answer(TEMPERATURE, prompt, cached)
+            return cached
+        client = get_client()
+        resp = call_with_limits(prompt, priority, lambda: client.chat.completions.create(
+            model=MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURE,
+        ))
+        record_usage(trace, resp)
+        answer = resp.choices[0].message.content.strip()
+        llm_cache.put(key, answer, model=MODEL, temperature=TEMPERATURE)
+        record_answer(TEMPERATURE, prompt, answer)
+        return answer
+
+def get_client() -> "OpenAI":
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        # Retries are handled by rate_limiter, which also backs off on 429s.
+        _client = OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1"),
+            max_retries=0,
+        )
+    return _client
+
+def get_async_client() -> "AsyncOpenAI":
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        from openai import AsyncOpenAI
+        _async_clients[loop] = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1"),
+            max_retries=0,
+        )
+    return _async_clients[loop]
+
+async def close_async_client():
+    async_client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if async_client is not None:
+        await async_client.close()
+
+async def ask_llm_async(prompt: str, temperature: float = TEMPERATURE, variant: int = 0,
+                        priority: int = PRIORITY_ANALYSIS) -> str:
+    with span("llm", "ask_llm_async", model=MODEL, prompt_bytes=len(prompt.encode("utf-8"))) as trace:
+        key = llm_cache.make_key(MODEL, temperature, prompt, variant)
+        answer = replayed_answer(temperature, prompt, variant, trace)
+        if answer is not None:
+            return answer
+        cached = llm_cache.get(key)
+        trace["cache_hit"] = cached is not None
+        if cached is not None:
+            record_answer(temperature, prompt, cached, variant)
+            return cached
+        async_client = get_async_client()
+        resp = await call_with_limits_async(prompt, priority, lambda: async_client.chat.completions.create(
+            model=MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+        ))
+        record_usage(trace, resp)
+        answer = resp.choices[0].message.content.strip()
+        llm_cache.put(key, answer, model=MODEL, temperature=temperature)
+        record_answer(temperature, prompt, answer, variant)
+        return answer
 
 def safe_get(state: Dict[str, Any], key: str, default=None):
     return state[key] if key in state else default
 
+def load_llm_json(output: str) -> Dict[str, Any]:
+    m = re.search(r"```(?:json)?\s*(\{.*\})\s*```", output, re.DOTALL)
+    json_str = m.group(1) if m else output.strip()
+    data = json.loads(json_str)
+    if not isinstance(data, dict):
+        raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+    return data
+
 def parse_llm_json(output: str) -> list:
     try:
-        m = re.search(r"```(?:json)?\s*(\{.*\})\s*```", output, re.DOTALL)
-        json_str = m.group(1) if m else output.strip()
-        data = json.loads(json_str)
-        return data.get("files", [])
+        return load_llm_json(output).get("files", [])
     except Exception as e:
         print(f"⚠️ Failed to parse JSON: {e}")
         print("LLM output:\n", output[:500])
         return []
 
-def apply_fixes(project: Path, files: List[Dict[str, str]]):
+def apply_fixes(project: Path, files: List[Dict[str, str]], verbose: bool = True) -> List[str]:
+    changed = []
     for file in files:
         rel_path = file.get("path")
+        diff = file.get("diff", "")
         content = file.get("content", "")
-        if not rel_path or not content:
+        if not rel_path or not (diff or content):
             continue
         target = project / rel_path
+        # Absolute paths, "..", or a symlink out (sandboxes link shared
+        # dependency trees) would write outside the project, or out of a
+        # candidate's sandbox into the real one.
+        if not target.resolve().is_relative_to(project.resolve()):
+            print(f"⚠️ Skipping {rel_path}: outside {project}.")
+            continue
+        if diff and target.exists():
+            try:
+                content = apply_diff(target.read_text(encoding="utf-8"), diff, rel_path)
+            except PatchError as e:
+                if not content:
+                    print(f"⚠️ Could not apply diff to {target}: {e}")
+                    continue
+                print(f"⚠️ Diff for {target} did not apply ({e}), using the full content instead.")
+        elif diff and not content:
+            print(f"⚠️ Got a diff for missing file {target}, skipping.")
+            continue
         target.parent.mkdir(parents=True, exist_ok=True)
         if target.exists():
             backup = target.with_suffix(target.suffix + ".bak")
             target.rename(backup)
         target.write_text(content, encoding="utf-8")
-        print(f"✅ Updated {target}")
-
-def get_failed_files(test_output: str) -> List[str]:
-    failed = []
-    for line in test_output.splitlines():
-        if line.startswith("FAILED") and "::" in line:
-            failed.append(line.split("::")[0].strip())
-    return list(set(failed))
+        changed.append(rel_path)
+        if verbose:
+            print(f"✅ Updated {target}")
+    workspace.invalidate(project, [project / rel for rel in changed])
+    if changed:
+        # The tree hash only covers sources and test config, but a fix can
+        # change any file a test reads (fixtures, seed data), so the memoized
+        # result is stale either way. Its file digests stay for impact selection.
+        key = project.resolve()
+        if key in _test_results:
+            _test_results[key] = (None, *_test_results[key][1:])
+    return changed
+
+def edit_format_instructions() -> str:
+    if EDIT_FORMAT == "full":
+        return """Generate corrected code snippets or full file replacements in JSON:
+{
+  "files": [
+    {"path": "relative/path/to/file", "content": "new content"}
+  ]
+}"""
+    return """Respond in JSON. For existing files give a unified diff with only the changed hunks
+(a few lines of context each); give full content only for new files:
+{
+  "files": [
+    {"path": "relative/path/to/file", "diff": "@@ -10,3 +10,4 @@\\n context\\n-old line\\n+new line\\n context"},
+    {"path": "relative/path/to/new_file", "content": "full file content"}
+  ]
+}"""
+
+def get_failed_files(result: TestRun) -> List[str]:
+    return result.failed_files()
+
+def get_failure_context(project: Path, result: TestRun) -> str:
+    # Exact bodies of the failing tests and of every project function on
+    # their tracebacks, looked up in the symbol index.
+    index = get_symbol_index(project, get_source_files(project))
+    seen, parts, used = set(), [], 0
+    for case in result.failures:
+        for sym in index.locate_failure(case.nodeid, case.trace):
+            if (sym.path, sym.name) in seen:
+                continue
+            seen.add((sym.path, sym.name))
+            block = f"=== {sym.path}:{sym.start}-{sym.end} ({sym.kind} {sym.name}) ===\n{index.body(sym)}"
+            cost = estimate_tokens(block)
+            if used + cost > FAILURE_CONTEXT_BUDGET:
+                continue
+            parts.append(block)
+            used += cost
+    return "\n".join(parts)
 
 # -----------------------
 # Graph Nodes
@@ -111,8 +409,8 @@ def node_understand(state: Dict[str, Any]) -> Dict[str, Any]:
         state["requirements"] = "⚠️ No project path found."
         return state
     readme_path = project / "README.md"
-    readme = readme_path.read_text() if readme_path.exists() else "(no README.md)"
-    test_output = run_tests(project)
+    readme = get_workspace(project).read(readme_path) if readme_path.exists() else "(no README.md)"
+    test_output = run_tests(project).for_prompt()
     lang = detect_language(project)
     prompt = f"""You are an assistant for a {lang} project. Analyze this project.
 
@@ -140,28 +438,66 @@ Create a step-by-step coding plan:
     state["plan"] = ask_llm(prompt)
     return state
 
+def _as_text(value: Any) -> str:
+    # Models sometimes answer a "string" field with a list of bullet points.
+    if isinstance(value, list):
+        return "\n".join(f"- {item}" for item in value)
+    return str(value or "").strip()
+
+def node_understand_and_plan(state: Dict[str, Any]) -> Dict[str, Any]:
+    # node_understand and node_plan in one call: the plan prompt only re-feeds
+    # the requirements, so both come back in one JSON answer.
+    project = safe_get(state, "project")
+    if not project:
+        state["requirements"] = "⚠️ No project path found."
+        return state
+    readme_path = project / "README.md"
+    readme = get_workspace(project).read(readme_path) if readme_path.exists() else "(no README.md)"
+    test_output = run_tests(project).for_prompt()
+    lang = detect_language(project)
+    prompt = f"""You are an assistant for a {lang} project. Analyze this project and plan the work.
+
+README:
+{readme}
+
+Current test output:
+{test_output}
+
+Respond in JSON:
+{{
+  "requirements": "concise list of requirements and what seems broken",
+  "plan": "step-by-step coding plan: files to change, functions to implement, fixes required"
+}}
+"""
+    output = ask_llm(prompt)
+    try:
+        data = load_llm_json(output)
+    except Exception as e:
+        print(f"⚠️ Failed to parse JSON: {e}")
+        data = {}
+    state["requirements"] = _as_text(data.get("requirements")) or output
+    state["plan"] = _as_text(data.get("plan"))
+    if not state["plan"]:
+        print("⚠️ No plan in the combined answer, asking for it separately.")
+        return node_plan(state)
+    return state
+
 def node_code(state: Dict[str, Any]) -> Dict[str, Any]:
     plan = safe_get(state, "plan", "")
     project = safe_get(state, "project")
     lang = detect_language(project)
-    files_list = get_source_files(project)
-    file_contents = "\n".join(f"=== {f.relative_to(project)} ===\n{f.read_text()[:1000]}" for f in files_list)
+    file_contents = build_context(project, get_source_files(project), plan)
     prompt = f"""You are coding assistant for a {lang} project.
 
 Plan:
 {plan}
 
-Current project files:
+Current project files (ranked by relevance; files marked "partial" omit unrelated code):
 {file_contents}
 
-Generate corrected code snippets or full file replacements in JSON:
-{{
-  "files": [
-    {{"path": "relative/path/to/file", "content": "new content"}}
-  ]
-}}
+{edit_format_instructions()}
 """
-    code_output = ask_llm(prompt)
+    code_output = ask_llm(prompt, priority=PRIORITY_CODE)
     state["code"] = code_output
     files = parse_llm_json(code_output)
     if project:
@@ -170,9 +506,37 @@ Generate corrected code snippets or full file replacements in JSON:
 
 def node_identify_errors(state: Dict[str, Any]) -> Dict[str, Any]:
     project = safe_get(state, "project")
-    test_output = run_tests(project)
+    result = run_tests(project)
+    test_output = result.for_prompt()
     state["test_output"] = test_output
-    failed_files = get_failed_files(test_output)
+    failed_files = get_failed_files(result)
+    failure_context = get_failure_context(project, result)
+    state["failure_context"] = failure_context
+
+    signature = failure_signature(result)
+    history = list(safe_get(state, "failure_history", []))
+    state["failure_signature"] = signature
+    state["failure_history"] = history + [signature]
+    known = failure_memo.get(project.name, signature) or {}
+    if signature and signature in history:
+        # The last fix left exactly the same failures: no new analysis will
+        # help, the fix has to change course.
+        failure_memo.stats["loops"] += 1
+        print(f"🔁 Same failures as an earlier iteration (signature {signature}); the last fix did not help.")
+        analysis = known.get("analysis") or safe_get(state, "error_analysis", "")
+        if LOOP_NOTE not in analysis:
+            analysis += LOOP_NOTE
+        state["error_analysis"] = analysis
+        return state
+    if known.get("analysis"):
+        failure_memo.stats["reused"] += 1
+        print(f"♻️ Reusing the stored analysis for failure signature {signature}")
+        analysis = known["analysis"]
+        if known.get("resolved_by"):
+            analysis += f"\n\nA fix that resolved these same failures before:\n{known['resolved_by']}"
+        state["error_analysis"] = analysis
+        return state
+
     lang = detect_language(project)
     prompt = f"""You are an assistant for a {lang} project.
 
@@ -182,40 +546,109 @@ Test results:
 Failed files:
 {', '.join(failed_files) if failed_files else 'None'}
 
+Code involved in the failures:
+{failure_context or 'None'}
+
 Explain what is failing and why.
 """
-    state["error_analysis"] = ask_llm(prompt)
+    analysis = ask_llm(prompt)
+    failure_memo.stats["analyzed"] += 1
+    failure_memo.record_analysis(project.name, signature, signature_parts(result), analysis)
+    state["error_analysis"] = analysis
     return state
 
-def node_fix(state: Dict[str, Any]) -> Dict[str, Any]:
+def score_test_run(result: TestRun) -> tuple:
+    counts = result.counts()
+    return (result.passed, counts["passed"] - counts["failed"] - counts["error"], -result.duration)
+
+def evaluate_candidate(project: Path, files: List[Dict[str, str]]) -> TestRun:
+    with sandbox(project) as scratch:
+        apply_fixes(scratch, files, verbose=False)
+        return _run_tests_uncached(scratch, warm=False)
+
+async def best_of_n_fix(project: Path, prompt: str, n: int):
+    # Sample n fixes at once, test each in its own scratch copy of the project
+    # and keep the best; only that one ever touches the real project.
+    outputs = await asyncio.gather(
+        *(ask_llm_async(prompt, CANDIDATE_TEMPERATURE, variant=i, priority=PRIORITY_FIX) for i in range(n)),
+        return_exceptions=True,
+    )
+    for output in outputs:
+        if isinstance(output, Exception):
+            print(f"⚠️ Fix candidate request failed: {output}")
+    candidates = [(o, parse_llm_json(o)) for o in outputs if isinstance(o, str)]
+    candidates = [c for c in candidates if c[1]]
+    if not candidates:
+        first = next((o for o in outputs if isinstance(o, str)), "")
+        return first, []
+    results = await asyncio.gather(*(asyncio.to_thread(evaluate_candidate, project, files)
+                                     for _, files in candidates))
+    best = max(range(len(candidates)), key=lambda i: score_test_run(results[i]))
+    for i, result in enumerate(results):
+        marker = "🏆" if i == best else "  "
+        print(f"{marker} Candidate {i + 1}/{len(candidates)}: {result.summary()}")
+    return candidates[best]
+
+async def node_fix(state: Dict[str, Any]) -> Dict[str, Any]:
     project = safe_get(state, "project")
     errors = safe_get(state, "error_analysis", "")
     previous_fix = safe_get(state, "fix", "")
-    lang = detect_language(project)
-    files_list = get_source_files(project)
-    file_contents = "\n".join(f"=== {f.relative_to(project)} ===\n{f.read_text()[:1000]}" for f in files_list)
+    test_output = safe_get(state, "test_output", "")
+    failure_context = safe_get(state, "failure_context", "")
+    file_contents = build_context(project, get_source_files(project), f"{errors}\n{test_output}\n{failure_context}")
     prompt = f"""Previous fix attempt:
 {previous_fix}
 
 Errors found:
 {errors}
 
-Current project files:
+Current project files (ranked by relevance; files marked "partial" omit unrelated code):
 {file_contents}
 
-Generate corrected file contents in JSON. Include only files that need changes.
+Include only files that need changes.
+{edit_format_instructions()}
 """
-    fix_output = ask_llm(prompt)
+    if project and FIX_CANDIDATES > 1:
+        fix_output, files = await best_of_n_fix(project, prompt, FIX_CANDIDATES)
+    else:
+        fix_output = await ask_llm_async(prompt, priority=PRIORITY_FIX)
+        files = parse_llm_json(fix_output)
     state["fix"] = fix_output
-    files = parse_llm_json(fix_output)
     if project:
         apply_fixes(project, files)
     return state
 
 def node_validate(state: Dict[str, Any]) -> Dict[str, Any]:
     project = safe_get(state, "project")
-    test_output = run_tests(project)
-    state["tests_passed"] = "failed" not in test_output.lower()
+    result = run_tests(project)
+    state["final_test_output"] = result.for_prompt()
+    state["tests_passed"] = result.passed
+    if result.passed:
+        failure_memo.record_resolution(project.name, safe_get(state, "failure_signature", ""),
+                                       safe_get(state, "fix", ""))
+    signature = failure_signature(result)
+    repeats = safe_get(state, "failure_history", []).count(signature) if signature else 0
+    state["loop_detected"] = repeats >= MAX_SIGNATURE_REPEATS
+    if state["loop_detected"]:
+        print(f"🔁 Failure signature {signature} came back {repeats} times; giving up on {project.name}.")
+    return state
+
+LOOP_NOTE = ("\n\nNote: the previous fix attempt left exactly the same failures. "
+             "Do not repeat it; take a different approach.")
+
+def node_next_iteration(state: Dict[str, Any]) -> Dict[str, Any]:
+    project = safe_get(state, "project")
+    iteration = safe_get(state, "iteration", 1)
+    print(f"❌ Tests still failing for {project.name}. Iterating again...")
+    print(f"--- Iteration {iteration + 1} ---")
+    state["iteration"] = iteration + 1
+    return state
+
+# The summary and judge nodes run concurrently after validate, so they only
+# return the keys they own instead of the whole state.
+async def node_validate_summary(state: Dict[str, Any]) -> Dict[str, Any]:
+    project = safe_get(state, "project")
+    test_output = safe_get(state, "final_test_output", "")
     lang = detect_language(project)
     prompt = f"""Final test results for a {lang} project:
 
@@ -223,13 +656,12 @@ def node_validate(state: Dict[str, Any]) -> Dict[str, Any]:
 
 Summarize: Did all tests pass? If not, what remains?
 """
-    state["validation"] = ask_llm(prompt)
-    return state
+    return {"validation": await ask_llm_async(prompt, priority=PRIORITY_SUMMARY)}
 
 # -----------------------
 # Judge Standout Summary
 # -----------------------
-def node_judge_summary(state: Dict[str, Any]) -> Dict[str, Any]:
+async def node_judge_summary(state: Dict[str, Any]) -> Dict[str, Any]:
     project = safe_get(state, "project")
     tests_passed = safe_get(state, "tests_passed", False)
     plan = safe_get(state, "plan", "")
@@ -258,65 +690,272 @@ Write a concise, impressive summary for judges highlighting:
 3. Why it is now better and unique
 4. Make it engaging and standout
 """
-    summary = ask_llm(prompt)
-    state["judge_summary"] = summary
+    summary = await ask_llm_async(prompt, priority=PRIORITY_SUMMARY)
 
     print("\n=== Judge Standout Summary ===")
     print(summary)
     print("============================\n")
-    return state
+    return {"judge_summary": summary}
 
 # -----------------------
 # Graph Definition
 # -----------------------
+class AgentState(TypedDict, total=False):
+    project: Path
+    iteration: int
+    requirements: str
+    plan: str
+    code: str
+    test_output: str
+    failure_context: str
+    error_analysis: str
+    fix: str
+    failure_signature: str
+    failure_history: List[str]
+    loop_detected: bool
+    final_test_output: str
+    tests_passed: bool
+    validation: str
+    judge_summary: str
+
 def build_graph():
-    g = StateGraph(dict)
-    g.add_node("understand", node_understand)
-    g.add_node("plan", node_plan)
-    g.add_node("code", node_code)
-    g.add_node("identify", node_identify_errors)
-    g.add_node("fix", node_fix)
-    g.add_node("validate", node_validate)
-    g.add_node("judge_summary", node_judge_summary)
-
-    g.set_entry_point("understand")
-    g.add_edge("understand", "plan")
-    g.add_edge("plan", "code")
+    from langgraph.graph import StateGraph, END
+    g = StateGraph(AgentState)
+    if PLAN_MODE == "fused":
+        g.add_node("understand_plan", traced_node("understand_plan", node_understand_and_plan))
+        g.add_edge("understand_plan", "code")
+    else:
+        g.add_node("understand", traced_node("understand", node_understand))
+        g.add_node("plan", traced_node("plan", node_plan))
+        g.add_edge("understand", "plan")
+        g.add_edge("plan", "code")
+    g.add_node("code", traced_node("code", node_code))
+    g.add_node("identify", traced_node("identify", node_identify_errors))
+    g.add_node("fix", traced_node("fix", node_fix))
+    g.add_node("validate", traced_node("validate", node_validate))
+    g.add_node("next_iteration", traced_node("next_iteration", node_next_iteration))
+    g.add_node("validate_summary", traced_node("validate_summary", node_validate_summary))
+    g.add_node("judge_summary", traced_node("judge_summary", node_judge_summary))
+
+    g.set_conditional_entry_point(route_entry, [first_node(), "identify"])
     g.add_edge("code", "identify")
     g.add_edge("identify", "fix")
     g.add_edge("fix", "validate")
-    g.add_edge("validate", "judge_summary")
+    g.add_conditional_edges("validate", route_after_validate,
+                            ["next_iteration", "validate_summary", "judge_summary"])
+    g.add_edge("next_iteration", "identify")
+    g.add_edge("validate_summary", END)
     g.add_edge("judge_summary", END)
     return g.compile()
 
+def get_graph():
+    # Compiled once per process and shared by every project.
+    global _graph
+    if _graph is None:
+        _graph = build_graph()
+    return _graph
+
+def route_entry(state: Dict[str, Any]) -> str:
+    # Requirements and plan do not change between retries; only derive them
+    # when the state does not carry them yet.
+    if safe_get(state, "requirements") and safe_get(state, "plan"):
+        return "identify"
+    return first_node()
+
+def first_node() -> str:
+    return "understand_plan" if PLAN_MODE == "fused" else "understand"
+
+def route_after_validate(state: Dict[str, Any]):
+    if (safe_get(state, "tests_passed", False) or safe_get(state, "loop_detected", False)
+            or safe_get(state, "iteration", 1) >= MAX_ITERATIONS):
+        return ["validate_summary", "judge_summary"]
+    return "next_iteration"
+
+async def _invoke_checkpointed(graph, state: Dict[str, Any], config: Dict[str, Any],
+                               thread_id: str, resume: bool) -> Dict[str, Any]:
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    CHECKPOINT_DB.parent.mkdir(parents=True, exist_ok=True)
+    # The sqlite connection is bound to the running loop, so it is opened per invocation.
+    async with AsyncSqliteSaver.from_conn_string(str(CHECKPOINT_DB)) as saver:
+        graph = graph.copy(update={"checkpointer": saver})
+        config = {**config, "configurable": {"thread_id": thread_id}}
+        await saver.setup()  # a fresh database has no tables until the first put
+        if not resume:
+            await saver.adelete_thread(thread_id)
+            return await graph.ainvoke(state, config)
+        snapshot = await graph.aget_state(config)
+        if snapshot.next:
+            iteration = snapshot.values.get("iteration", 1)
+            print(f"↩️  Resuming {thread_id} at iteration {iteration}, before {', '.join(snapshot.next)}")
+            return await graph.ainvoke(None, config)
+        if snapshot.values:
+            print(f"↩️  {thread_id} already finished in the saved run; reusing its final state")
+            return snapshot.values
+        print(f"No checkpoint for {thread_id}; starting from scratch")
+        print("--- Iteration 1 ---")
+        return await graph.ainvoke(state, config)
+
+def invoke_graph(graph, state: Dict[str, Any], thread_id: str = None, resume: bool = False) -> Dict[str, Any]:
+    # identify -> fix -> validate -> next_iteration is four steps per retry.
+    config = {"recursion_limit": 10 + 4 * MAX_ITERATIONS}
+
+    async def _run():
+        try:
+            if CHECKPOINTS and thread_id:
+                return await _invoke_checkpointed(graph, state, config, thread_id, resume)
+            return await graph.ainvoke(state, config)
+        finally:
+            await close_async_client()
+    return asyncio.run(_run())
+
 # -----------------------
 # Main
 # -----------------------
-def main():
+def run_project(project: Path, graph=None, resume: bool = False) -> Dict[str, Any]:
+    graph = graph or get_graph()
+    print(f"\n🚀 Processing {project.name}...\n")
+    if not resume:
+        print("--- Iteration 1 ---")
+    tracing.set_context(project=project.name)
+    final_state = invoke_graph(graph, {"project": project, "iteration": 1},
+                               thread_id=project.name, resume=resume)
+    iterations = safe_get(final_state, "iteration", 1)
+    if safe_get(final_state, "tests_passed", False):
+        print(f"🎉 All tests passed for {project.name}!")
+    else:
+        print(f"❌ Tests still failing for {project.name} after {iterations} iteration(s).")
+    print("\n--- REPORT ---")
+    print("Requirements:\n", final_state.get("requirements", ""))
+    print("\nPlan:\n", final_state.get("plan", ""))
+    print("\nCode Proposal:\n", final_state.get("code", ""))
+    print("\nError Analysis:\n", final_state.get("error_analysis", ""))
+    print("\nFix Proposal:\n", final_state.get("fix", ""))
+    print("\nValidation:\n", final_state.get("validation", ""))
+    print("\nJudge Standout Summary:\n", final_state.get("judge_summary", ""))
+    return final_state
+
+EXIT_PASSED, EXIT_CRASHED, EXIT_FAILING = 0, 2, 3
+
+def run_project_isolated(project: Path, extra_args: List[str] = (), rate_share: int = 1) -> Dict[str, Any]:
+    # Each project runs in its own interpreter so its stdout stays separate
+    # and a crash (or a hung import) cannot take the other projects down.
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--project", project.name, *extra_args]
+    start = time.perf_counter()
+    env = dict(os.environ, AGENT_PARALLEL_CHILD="1", AGENT_RATE_SHARE=str(rate_share))
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    wall = time.perf_counter() - start
+    # An uncaught exception also exits with 1, so failing tests get a code of their own.
+    status = {EXIT_PASSED: "passed", EXIT_FAILING: "failing"}.get(proc.returncode, "crashed")
+    return {"name": project.name, "status": status, "wall": wall, "output": proc.stdout + proc.stderr}
+
+def load_serial_timings() -> Dict[str, float]:
+    try:
+        return json.loads(SERIAL_TIMINGS.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def save_serial_timings(results: List[Dict[str, Any]]):
+    timings = {**load_serial_timings(), **{r["name"]: round(r["wall"], 3) for r in results}}
+    SERIAL_TIMINGS.parent.mkdir(parents=True, exist_ok=True)
+    SERIAL_TIMINGS.write_text(json.dumps(timings, indent=2), encoding="utf-8")
+
+def print_run_summary(results: List[Dict[str, Any]], total_wall: float, parallel: bool):
+    icons = {"passed": "✅", "failing": "❌", "crashed": "💥"}
+    print("\n=== Run Summary ===")
+    for r in sorted(results, key=lambda r: r["name"]):
+        print(f"{icons[r['status']]} {r['name']:<30} {r['status']:<8} {r['wall']:8.1f}s")
+    if not parallel:
+        print(f"Total wall time: {total_wall:.1f}s")
+        return
+    # Project times measured under --jobs overlap and compete for CPU, so
+    # their sum overstates the serial time; compare with a stored serial run.
+    baseline = load_serial_timings()
+    if all(r["name"] in baseline for r in results):
+        serial_wall = sum(baseline[r["name"]] for r in results)
+        print(f"Total wall time: {total_wall:.1f}s (serial baseline {serial_wall:.1f}s, "
+              f"speedup {serial_wall / total_wall if total_wall else 1.0:.2f}x)")
+    else:
+        print(f"Total wall time: {total_wall:.1f}s (sum of project times {sum(r['wall'] for r in results):.1f}s; "
+              f"run without --jobs once to record a serial baseline)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mini Coding Agent")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="number of projects to process in parallel")
+    parser.add_argument("--project", action="append", default=[],
+                        help="only process the named project (repeatable)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="bypass the on-disk LLM response cache and failure memo")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue each project from its last checkpointed node")
+    parser.add_argument("--results-json", type=Path,
+                        help="also write each project's status and wall time to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.no_cache:
+        llm_cache.enabled = False
+        failure_memo.enabled = False
     print("=== Mini Coding Agent ===")
     projects = [p for p in PROJECTS_DIR.iterdir() if p.is_dir()]
-    graph = build_graph()
-    for project in projects:
-        print(f"\n🚀 Processing {project.name}...\n")
-        iteration = 0
-        final_state = {"project": project}
-        while iteration < MAX_ITERATIONS:
-            print(f"--- Iteration {iteration + 1} ---")
-            final_state = graph.invoke(final_state)
-            if safe_get(final_state, "tests_passed", False):
-                print(f"🎉 All tests passed for {project.name}!")
-                break
-            else:
-                print(f"❌ Tests still failing for {project.name}. Iterating again...")
-                iteration += 1
-        print("\n--- REPORT ---")
-        print("Requirements:\n", final_state.get("requirements", ""))
-        print("\nPlan:\n", final_state.get("plan", ""))
-        print("\nCode Proposal:\n", final_state.get("code", ""))
-        print("\nError Analysis:\n", final_state.get("error_analysis", ""))
-        print("\nFix Proposal:\n", final_state.get("fix", ""))
-        print("\nValidation:\n", final_state.get("validation", ""))
-        print("\nJudge Standout Summary:\n", final_state.get("judge_summary", ""))
+    if args.project:
+        projects = [p for p in projects if p.name in args.project]
+    if not projects:
+        print(f"💥 No projects matched {', '.join(args.project) or 'in ' + str(PROJECTS_DIR)}.")
+        return EXIT_CRASHED
+    results = []
+    start = time.perf_counter()
+    if args.jobs > 1 and len(projects) > 1:
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            extra_args = [flag for flag, on in (("--no-cache", args.no_cache), ("--resume", args.resume)) if on]
+            rate_share = min(args.jobs, len(projects))
+            futures = [pool.submit(run_project_isolated, p, extra_args, rate_share) for p in projects]
+            for future in as_completed(futures):
+                result = future.result()
+                print(f"\n{'=' * 30} {result['name']} ({result['wall']:.1f}s) {'=' * 30}")
+                print(result["output"])
+                results.append(result)
+    else:
+        graph = get_graph()
+        for project in projects:
+            project_start = time.perf_counter()
+            try:
+                final_state = run_project(project, graph, resume=args.resume)
+                status = "passed" if safe_get(final_state, "tests_passed", False) else "failing"
+            except Exception:
+                traceback.print_exc()
+                print(f"💥 Agent crashed while processing {project.name}.")
+                status = "crashed"
+            results.append({"name": project.name, "status": status, "wall": time.perf_counter() - project_start})
+    total_wall = time.perf_counter() - start
+    parallel = args.jobs > 1 and len(projects) > 1
+    if not parallel and not os.getenv("AGENT_PARALLEL_CHILD"):
+        save_serial_timings(results)
+    print_run_summary(results, total_wall, parallel)
+    if args.results_json:
+        summary = {"wall": total_wall, "projects": [{k: r[k] for k in ("name", "status", "wall")} for r in results]}
+        args.results_json.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    if llm_cache.stats["hits"] or llm_cache.stats["misses"] or llm_cache.stats["bypassed"]:
+        print(llm_cache.summary())
+    if compaction.totals["bytes_in"]:
+        print(compaction.summary())
+    if any(failure_memo.stats.values()):
+        print(failure_memo.summary())
+    if workspace.totals()["reads"]:
+        print(workspace.summary())
+    if limiter.stats["calls"]:
+        print(limiter.summary())
+    if tracing.TRACE_ENABLED and not os.getenv("AGENT_PARALLEL_CHILD"):
+        print(f"\n=== Trace Summary ({tracing.RUN_ID}, spans in {tracing.TRACE_FILE}) ===")
+        print(tracing.summarize(tracing.load_spans()))
+    if any(r["status"] == "crashed" for r in results):
+        return EXIT_CRASHED
+    return EXIT_PASSED if all(r["status"] == "passed" for r in results) else EXIT_FAILING
 
 if __name__ == "__main__":
-    main()
+    try:
+        sys.exit(main())
+    except Exception:
+        traceback.print_exc()
+        sys.exit(EXIT_CRASHED)
@@ -0,0 +1,224 @@
+# benchmark.py
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import replay
+
+# -----------------------
+# Config
+# -----------------------
+RESULTS_DIR = Path(os.getenv("BENCHMARK_DIR", ".agent_runs/benchmarks"))
+DEFAULT_CASSETTE = Path(".agent_runs/cassettes/flask.jsonl")
+PROJECTS = Path("projects")
+SKIPPED = shutil.ignore_patterns("*.bak", "__pycache__", ".pytest_cache", "unit.xml")
+
+# -----------------------
+# Helpers
+# -----------------------
+def git_revision() -> Dict[str, Any]:
+    def git(*args):
+        proc = subprocess.run(["git", *args], capture_output=True, text=True)
+        return proc.stdout.strip() if proc.returncode == 0 else ""
+    return {"commit": git("rev-parse", "HEAD"), "subject": git("log", "-1", "--format=%s"),
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+def copy_projects(names: List[str], dest: Path):
+    # The agent edits the projects it works on; benchmark on scratch copies.
+    for name in names:
+        shutil.copytree(PROJECTS / name, dest / name, ignore=SKIPPED, symlinks=True)
+
+def aggregate(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    nodes: Dict[str, Dict[str, float]] = defaultdict(lambda: {"wall": 0.0, "runs": 0})
+    llm = {"calls": 0, "prompt_bytes": 0, "prompt_tokens": 0, "completion_tokens": 0, "wall": 0.0}
+    tests = {"runs": 0, "wall": 0.0, "output_bytes": 0}
+    for s in spans:
+        if s["kind"] == "node":
+            nodes[s["name"]]["wall"] += s["wall"]
+            nodes[s["name"]]["runs"] += 1
+        elif s["kind"] == "llm":
+            llm["calls"] += 1
+            llm["wall"] += s["wall"]
+            llm["prompt_bytes"] += s.get("prompt_bytes") or 0
+            llm["prompt_tokens"] += s.get("prompt_tokens") or 0
+            llm["completion_tokens"] += s.get("completion_tokens") or 0
+        elif s["kind"] == "subprocess":
+            tests["runs"] += 1
+            tests["wall"] += s["wall"]
+            tests["output_bytes"] += s.get("output_bytes") or 0
+    return {"nodes": dict(nodes), "llm": llm, "tests": tests}
+
+# -----------------------
+# Run
+# -----------------------
+def run_benchmark(args) -> Dict[str, Any]:
+    names = args.project or sorted(p.name for p in PROJECTS.glob("flask-*") if p.is_dir())
+    workdir = Path(tempfile.mkdtemp(prefix="agent-bench-"))
+    run_id = f"bench_{int(time.time())}_{os.getpid()}"
+    copy_projects(names, workdir / "projects")
+    cassette = replay.Cassette(args.cassette)
+    server = None
+    env = {
+        "AGENT_PROJECTS_DIR": str(workdir / "projects"),
+        "AGENT_TRACE_FILE": str(workdir / "trace.jsonl"),
+        "AGENT_CHECKPOINT_DB": str(workdir / "checkpoints.sqlite"),
+        "AGENT_SERIAL_TIMINGS": str(workdir / "serial-timings.json"),
+        "AGENT_RUN_ID": run_id,
+        "MAX_AGENT_ITERS": str(args.iterations),
+        "PLAN_MODE": args.plan_mode,
+    }
+    if args.record:
+        # Real API; every answer is appended to the cassette for later replays.
+        # replay read LLM_RECORD when it was imported, so set its recorder here
+        # as well; the env var still reaches --jobs children.
+        env["LLM_RECORD"] = str(args.cassette)
+        replay.recorder = cassette
+    else:
+        server = replay.start_stub_server(cassette, latency=args.latency, jitter=args.jitter)
+        env.update(OPENAI_API_BASE=f"http://127.0.0.1:{server.server_address[1]}/v1",
+                   OPENAI_API_KEY="benchmark", LLM_RPM_LIMIT="", LLM_TPM_LIMIT="")
+    os.environ.update(env)
+    # agent and tracing read their configuration at import time, so import them only now.
+    import agent
+    import tracing
+
+    agent_args = ["--no-cache", "--results-json", str(workdir / "results.json"), "--jobs", str(args.jobs)]
+    for name in names:
+        agent_args += ["--project", name]
+    log = workdir / "agent.log"
+    print(f"Benchmarking {', '.join(names)} ({'recording' if args.record else 'replaying'} "
+          f"{args.cassette}); agent output in {log}")
+    start = time.perf_counter()
+    with open(log, "w", encoding="utf-8") as f, contextlib.redirect_stdout(f):
+        exit_code = agent.main(agent_args)
+    wall = time.perf_counter() - start
+    if server is not None:
+        server.shutdown()
+
+    try:
+        projects = json.loads((workdir / "results.json").read_text(encoding="utf-8"))["projects"]
+    except (OSError, ValueError, KeyError):
+        projects = []
+    result = {
+        "label": args.label,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **git_revision(),
+        "config": {"projects": names, "iterations": args.iterations, "jobs": args.jobs, "plan_mode": args.plan_mode,
+                   "latency": args.latency, "jitter": args.jitter, "record": args.record,
+                   "cassette": str(args.cassette)},
+        "exit_code": exit_code,
+        "wall": round(wall, 3),
+        "projects": projects,
+        "cassette": dict(cassette.stats) if server is not None else
+                    dict(replay.recorder.stats) if replay.recorder else {},
+        **aggregate(tracing.load_spans(run_id)),
+    }
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+def save(result: Dict[str, Any]) -> Path:
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = result["timestamp"].replace(":", "").replace("-", "")
+    path = RESULTS_DIR / f"{stamp}-{(result['commit'] or 'nogit')[:7]}.json"
+    path.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    return path
+
+# -----------------------
+# Reporting
+# -----------------------
+def metrics(result: Dict[str, Any]) -> Dict[str, float]:
+    flat = {
+        "wall s": result["wall"],
+        "llm calls": result["llm"]["calls"],
+        "prompt KB": result["llm"]["prompt_bytes"] / 1024,
+        "prompt tok": result["llm"]["prompt_tokens"],
+        "completion tok": result["llm"]["completion_tokens"],
+        # Understanding and planning, whichever nodes did it, so the two PLAN_MODEs compare.
+        "planning s": sum(result["nodes"].get(n, {}).get("wall", 0.0)
+                          for n in ("understand", "plan", "understand_plan")),
+        "test runs": result["tests"]["runs"],
+        "tests s": result["tests"]["wall"],
+        "passed": sum(1 for p in result["projects"] if p["status"] == "passed"),
+    }
+    for name, node in sorted(result["nodes"].items()):
+        flat[f"node {name} s"] = node["wall"]
+    return flat
+
+def column_title(result: Dict[str, Any]) -> str:
+    title = f"{result['commit'][:7] or '-'}{'*' if result['dirty'] else ''}"
+    # Results from before PLAN_MODE existed ran the two-call path.
+    if result["config"].get("plan_mode", "separate") != "separate":
+        title += f" {result['config']['plan_mode']}"
+    return title
+
+def report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> str:
+    current = metrics(result)
+    before = metrics(baseline) if baseline else {}
+    header = f"{'metric':<26}{column_title(result):>16}"
+    if baseline:
+        header += f"{column_title(baseline):>16}{'change':>10}"
+    lines = [header, "-" * len(header)]
+    for name, value in current.items():
+        line = f"{name:<26}{value:>16.2f}"
+        if baseline:
+            old = before.get(name)
+            if old is None:
+                line += f"{'-':>16}{'':>10}"
+            else:
+                change = f"{100.0 * (value - old) / old:+.0f}%" if old else "-"
+                line += f"{old:>16.2f}{change:>10}"
+        lines.append(line)
+    for p in result["projects"]:
+        lines.append(f"  {p['name']:<24}{p['status']:>16}{p['wall']:>10.1f}s")
+    stats = result.get("cassette") or {}
+    if stats:
+        lines.append("cassette: " + ", ".join(f"{k} {v}" for k, v in stats.items()))
+    return "\n".join(lines)
+
+def previous_result(exclude: Path) -> Optional[Dict[str, Any]]:
+    candidates = sorted(p for p in RESULTS_DIR.glob("*.json") if p != exclude)
+    return json.loads(candidates[-1].read_text(encoding="utf-8")) if candidates else None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the agent over the bundled flask projects")
+    parser.add_argument("--cassette", type=Path, default=DEFAULT_CASSETTE,
+                        help="recorded LLM answers to replay (or to record into with --record)")
+    parser.add_argument("--record", action="store_true",
+                        help="call the real API and record its answers into the cassette")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub server latency per call, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="stub server latency jitter, seconds")
+    parser.add_argument("--iterations", type=int, default=2, help="MAX_AGENT_ITERS for the run")
+    parser.add_argument("--jobs", "-j", type=int, default=1)
+    parser.add_argument("--plan-mode", choices=["separate", "fused"], default=os.getenv("PLAN_MODE", "separate"),
+                        help="two LLM calls for requirements and plan, or one fused call")
+    parser.add_argument("--project", action="append", default=[], help="benchmark only these projects")
+    parser.add_argument("--label", default="", help="free-form note stored with the result")
+    parser.add_argument("--compare", type=Path, nargs="?", const=Path("last"),
+                        help="compare with a stored result (default: the most recent one)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    result = run_benchmark(args)
+    path = save(result)
+    baseline = None
+    if args.compare is not None:
+        baseline = (previous_result(path) if str(args.compare) == "last"
+                    else json.loads(args.compare.read_text(encoding="utf-8")))
+    print(report(result, baseline))
+    print(f"Result stored in {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
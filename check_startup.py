@@ -0,0 +1,60 @@
+# check_startup.py
+import os
+import re
+import sys
+import subprocess
+from typing import Dict, List, Tuple
+
+# Cumulative import time allowed per entry point, in milliseconds, on top of
+# the interpreter's own startup.
+BUDGETS_MS = {
+    "cli_ui": float(os.getenv("CLI_IMPORT_BUDGET_MS", 50)),
+    "agent": float(os.getenv("AGENT_IMPORT_BUDGET_MS", 250)),
+}
+# Loaded on first use only; importing any of them at startup costs 0.1-1.5s.
+DEFERRED = ["openai", "langgraph", "httpx", "langgraph.checkpoint.sqlite", "http.server"]
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+def import_profile(module: str) -> Tuple[List[Tuple[str, int, int]], List[str]]:
+    # A fresh interpreter per entry point, so nothing is already cached.
+    code = f"import sys, {module}; print('\\n'.join(sorted(sys.modules)))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, env=dict(os.environ, OPENAI_API_KEY="startup-check"))
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(2)), len(m.group(3)) // 2))
+    return rows, proc.stdout.split()
+
+def check(module: str, budget_ms: float) -> List[str]:
+    rows, loaded = import_profile(module)
+    total = next((cumulative for name, cumulative, depth in rows if name == module and depth == 0), None)
+    if total is None:
+        return [f"{module}: failed to import"]
+    problems = []
+    ms = total / 1000
+    print(f"{module:<10} {ms:8.1f} ms (budget {budget_ms:.0f} ms)")
+    if ms > budget_ms:
+        problems.append(f"{module}: imports take {ms:.1f} ms, over the {budget_ms:.0f} ms budget")
+        slowest: Dict[str, int] = {name: c for name, c, depth in rows if depth == 1}
+        for name, cumulative in sorted(slowest.items(), key=lambda kv: -kv[1])[:5]:
+            problems.append(f"    {name:<30} {cumulative / 1000:8.1f} ms")
+    for name in DEFERRED:
+        if name in loaded:
+            problems.append(f"{module}: imports {name} eagerly; import it where it is used")
+    return problems
+
+def main() -> int:
+    problems = []
+    for module, budget in BUDGETS_MS.items():
+        problems += check(module, budget)
+    if problems:
+        print("\n".join(problems))
+        return 1
+    print("Startup within budget.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,30 +1,29 @@
 # cli_ui.py
 import os
 from pathlib import Path
-from agent import build_graph, safe_get, MAX_ITERATIONS, PROJECTS_DIR
+
+# Same default as agent.PROJECTS_DIR; agent itself is only imported once a
+# project has been picked, so the menu does not wait for openai and langgraph.
+PROJECTS_DIR = Path(os.getenv("AGENT_PROJECTS_DIR", "projects"))
 
 def run_agent_for_project(project: Path):
-    graph = build_graph()
-    iteration = 0
-    state = {"project": project}
-
-    while iteration < MAX_ITERATIONS:
-        print(f"\n--- Iteration {iteration + 1} ---")
-        state = graph.invoke(state)
-
-        print("\nRequirements:\n", safe_get(state, "requirements", ""))
-        print("\nPlan:\n", safe_get(state, "plan", ""))
-        print("\nCode Proposal:\n", safe_get(state, "code", ""))
-        print("\nError Analysis:\n", safe_get(state, "error_analysis", ""))
-        print("\nFix Proposal:\n", safe_get(state, "fix", ""))
-        print("\nValidation:\n", safe_get(state, "validation", ""))
-
-        if safe_get(state, "tests_passed", False):
-            print(f"\n🎉 All tests passed for {project.name}!")
-            break
-        else:
-            print(f"\n❌ Tests still failing. Iterating again...")
-            iteration += 1
+    from agent import get_graph, invoke_graph, safe_get
+    # The retry loop lives in the graph; one invocation runs every iteration.
+    graph = get_graph()
+    print(f"\n--- Iteration 1 ---")
+    state = invoke_graph(graph, {"project": project, "iteration": 1})
+
+    print("\nRequirements:\n", safe_get(state, "requirements", ""))
+    print("\nPlan:\n", safe_get(state, "plan", ""))
+    print("\nCode Proposal:\n", safe_get(state, "code", ""))
+    print("\nError Analysis:\n", safe_get(state, "error_analysis", ""))
+    print("\nFix Proposal:\n", safe_get(state, "fix", ""))
+    print("\nValidation:\n", safe_get(state, "validation", ""))
+
+    if safe_get(state, "tests_passed", False):
+        print(f"\n🎉 All tests passed for {project.name}!")
+    else:
+        print(f"\n❌ Tests still failing after {safe_get(state, 'iteration', 1)} iteration(s).")
 
 def main():
     projects = [p for p in PROJECTS_DIR.iterdir() if p.is_dir()]
@@ -0,0 +1,213 @@
+# compaction.py
+import os
+import re
+import hashlib
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+# -----------------------
+# Config
+# -----------------------
+MAX_FRAMES = int(os.getenv("COMPACT_MAX_FRAMES", 8))
+MAX_BLOCK_LINES = 400
+
+# Frames from the interpreter, the test runner or third-party packages say
+# little about what the project did wrong.
+FRAMEWORK_PATH = re.compile(r"site-packages|dist-packages|/lib/python\d|<frozen |_pytest|pluggy|node_modules|node:internal")
+# Python tracebacks: '  File "/x/site-packages/flask/app.py", line 12, in wsgi_app'
+PY_FRAME = re.compile(r'^(\s*)File "([^"]+)", line \d+')
+# pytest short frames: "/x/site-packages/flask/app.py:12: in wsgi_app"
+PYTEST_FRAME = re.compile(r"^(\S+\.py):\d+: in \S+")
+# Java and JavaScript stacks: "\tat org.junit.Assert.fail(Assert.java:89)"
+AT_FRAME = re.compile(r"^\s+at (\S+)")
+JAVA_FRAMEWORK = re.compile(r"^(java|javax|jdk|sun|org\.junit|junit|org\.apache\.maven|org\.springframework|org\.gradle)\.")
+AT_CONTINUATION = re.compile(r"^\s+\.\.\. \d+ (more|common frames omitted)")
+SECTION = re.compile(r"^=+ (.+?) =+$")
+MAVEN_NOISE = re.compile(r"^\[INFO\] (Download(ing|ed) from|Progress)|^Progress \(\d+\)")
+VOLATILE = re.compile(r"0x[0-9a-fA-F]+|\d+")
+
+def _is_framework_frame(line: str) -> bool:
+    m = PY_FRAME.match(line)
+    if m:
+        return bool(FRAMEWORK_PATH.search(m.group(2)))
+    m = PYTEST_FRAME.match(line)
+    if m:
+        return bool(FRAMEWORK_PATH.search(m.group(1)))
+    m = AT_FRAME.match(line)
+    if m:
+        return bool(JAVA_FRAMEWORK.match(m.group(1)) or FRAMEWORK_PATH.search(line))
+    return False
+
+# -----------------------
+# Streaming compactor
+# -----------------------
+class Compactor:
+    """Compacts test runner output one line at a time.
+
+    Memory is bounded by the compacted output plus one traceback block:
+    repeated tracebacks are dropped after their first occurrence, framework
+    frames are folded, each traceback keeps at most MAX_FRAMES project frames,
+    warnings summaries and Maven download chatter are stripped, and runs of
+    identical lines collapse to one.
+    """
+
+    def __init__(self, out=None, record: bool = True):
+        # `out` receives the compacted lines; anything with append() that
+        # iterates back over what it kept (a list, or streaming.BoundedOutput).
+        # `record` adds the bytes to the run's totals; off for text that was
+        # already counted as part of a runner's output (JUnit failure traces).
+        self.out = out if out is not None else []
+        self.record = record
+        self.bytes_in = 0
+        self.seen_blocks: Dict[str, int] = {}
+        self.block: Optional[deque] = None
+        self.block_kind = ""
+        self.block_dropped = 0
+        self.in_warnings = False
+        self.stripped = 0
+        self.last_line: Optional[str] = None
+        self.repeats = 0
+
+    # -- input --
+    def feed(self, line: str):
+        self.bytes_in += len(line.encode("utf-8", "replace"))
+        line = line.rstrip("\r\n")
+        if self.block is not None:
+            if self._continues_block(line):
+                self._add_to_block(line)
+                return
+            if self.block_kind == "py" and line and not line[0].isspace():
+                self._add_to_block(line)  # the exception line closes a Python traceback
+                self._end_block()
+                return
+            self._end_block()
+        section = SECTION.match(line)
+        if section:
+            self.in_warnings = "warnings summary" in section.group(1)
+            if self.in_warnings:
+                self.stripped += 1
+                return
+        elif self.in_warnings or MAVEN_NOISE.match(line) or line.startswith("-- Docs: https://docs.pytest.org"):
+            self.stripped += 1
+            return
+        if line.startswith("Traceback (most recent call last)"):
+            self._start_block("py", line)
+        elif AT_FRAME.match(line) or PYTEST_FRAME.match(line):
+            self._start_block("at" if AT_FRAME.match(line) else "pytest", line)
+        else:
+            self._emit(line)
+
+    def _continues_block(self, line: str) -> bool:
+        if self.block_kind == "py":
+            return line[:1].isspace()
+        if self.block_kind == "at":
+            return bool(AT_FRAME.match(line) or AT_CONTINUATION.match(line))
+        # pytest short frames: location line followed by indented source lines
+        return bool(PYTEST_FRAME.match(line)) or line.startswith("    ")
+
+    # -- traceback blocks --
+    def _start_block(self, kind: str, line: str):
+        self.block = deque(maxlen=MAX_BLOCK_LINES)
+        self.block_kind = kind
+        self.block_dropped = 0
+        self._add_to_block(line)
+
+    def _add_to_block(self, line: str):
+        if len(self.block) == self.block.maxlen:
+            self.block_dropped += 1
+        self.block.append(line)
+
+    def _frames(self, lines: List[str]) -> List[List[str]]:
+        # Split a block into frames: a frame line plus its indented source lines.
+        frames: List[List[str]] = []
+        for line in lines:
+            if PY_FRAME.match(line) or PYTEST_FRAME.match(line) or AT_FRAME.match(line) or not frames:
+                frames.append([line])
+            else:
+                frames[-1].append(line)
+        return frames
+
+    def _end_block(self):
+        lines = list(self.block)
+        self.block = None
+        digest = hashlib.sha1(VOLATILE.sub("#", "\n".join(lines)).encode("utf-8")).hexdigest()
+        count = self.seen_blocks.get(digest, 0)
+        self.seen_blocks[digest] = count + 1
+        if count:
+            if count == 1:
+                self._emit("    (same traceback as above; further repeats omitted)")
+            return
+        if self.block_dropped:
+            self._emit(f"    ... ({self.block_dropped} traceback lines omitted) ...")
+        frames = self._frames(lines)
+        head = frames[:1] if self.block_kind == "py" else []
+        tail = frames[-1:] if self.block_kind == "py" else []
+        body = frames[len(head):len(frames) - len(tail)]
+        kept: List[List[str]] = []
+        folded = 0
+        for frame in body:
+            if _is_framework_frame(frame[0]):
+                folded += 1
+                continue
+            if folded:
+                kept.append([f"    ... {folded} framework frame(s) folded ..."])
+                folded = 0
+            kept.append(frame)
+        if folded:
+            kept.append([f"    ... {folded} framework frame(s) folded ..."])
+        project_frames = [f for f in kept if not f[0].lstrip().startswith("... ")]
+        if len(project_frames) > MAX_FRAMES:
+            # Python lists the innermost frame last, Java and JS first.
+            keep = project_frames[-MAX_FRAMES:] if self.block_kind != "at" else project_frames[:MAX_FRAMES]
+            marker = [f"    ... {len(project_frames) - MAX_FRAMES} more frame(s) omitted ..."]
+            kept = ([marker] + keep) if self.block_kind != "at" else (keep + [marker])
+        for frame in head + kept + tail:
+            for line in frame:
+                self._emit(line)
+
+    # -- output --
+    def _emit(self, line: str):
+        if line == self.last_line:
+            self.repeats += 1
+            return
+        self._flush_repeats()
+        self.out.append(line)
+        self.last_line = line
+
+    def _flush_repeats(self):
+        if self.repeats:
+            self.out.append(f"    (previous line repeated {self.repeats} more time(s))")
+            self.repeats = 0
+
+    def result(self) -> str:
+        if self.block is not None:
+            self._end_block()
+        self._flush_repeats()
+        if self.stripped:
+            self.out.append(f"({self.stripped} warning/download lines stripped)")
+            self.stripped = 0
+        text = "\n".join(self.out)
+        if self.record:
+            totals["bytes_in"] += self.bytes_in
+            totals["bytes_out"] += len(text.encode("utf-8"))
+        return text
+
+def compact_lines(lines: Iterable[str], record: bool = True) -> str:
+    compactor = Compactor(record=record)
+    for line in lines:
+        compactor.feed(line)
+    return compactor.result()
+
+def compact(text: str, record: bool = True) -> str:
+    return compact_lines(text.splitlines(), record)
+
+# -----------------------
+# Reporting
+# -----------------------
+totals = {"bytes_in": 0, "bytes_out": 0}
+
+def summary() -> str:
+    saved = max(0, totals["bytes_in"] - totals["bytes_out"])
+    # ~4 bytes per token, the estimate context_builder uses as well.
+    return (f"Test output compaction: {totals['bytes_in'] / 1024:.1f} KB -> {totals['bytes_out'] / 1024:.1f} KB "
+            f"(saved {saved / 1024:.1f} KB, ~{saved // 4} tokens)")
@@ -0,0 +1,222 @@
+# context_builder.py
+import os
+import re
+import math
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from symbol_index import Symbol, get_symbol_index
+from workspace import get_workspace
+
+# -----------------------
+# Config
+# -----------------------
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 6000))
+MAX_CHUNK_LINES = 80
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+def estimate_tokens(text: str) -> int:
+    # Rough, model-agnostic: ~4 characters per token for code.
+    return len(text) // 4 + 1
+
+# -----------------------
+# Chunking
+# -----------------------
+@dataclass
+class Chunk:
+    path: str
+    start: int  # 1-based, inclusive
+    end: int
+    name: str
+    text: str
+
+def _line_chunks(rel: str, lines: List[str]) -> List[Chunk]:
+    return [Chunk(rel, i + 1, min(i + MAX_CHUNK_LINES, len(lines)), "",
+                  "\n".join(lines[i:i + MAX_CHUNK_LINES]))
+            for i in range(0, len(lines), MAX_CHUNK_LINES)]
+
+def _python_chunks(rel: str, lines: List[str], symbols: List[Symbol]) -> List[Chunk]:
+    if not symbols:
+        return _line_chunks(rel, lines)
+    spans: List[Tuple[int, int, str]] = []
+
+    def add(syms: List[Symbol]):
+        for sym in syms:
+            children = [s for s in symbols if s.parent == sym.name]
+            if sym.kind == "class" and children and sym.end - sym.start + 1 > MAX_CHUNK_LINES:
+                # Large classes are split into their header and one chunk per method.
+                spans.append((sym.start, min(c.start for c in children) - 1, sym.name))
+                add(children)
+            else:
+                spans.append((sym.start, sym.end, sym.name))
+
+    add([s for s in symbols if s.parent is None])
+    covered = set()
+    for start, end, _ in spans:
+        covered.update(range(start, end + 1))
+    # Whatever is left at module level (imports, globals, app setup) becomes
+    # one chunk per contiguous run of lines.
+    run_start = None
+    for i in range(1, len(lines) + 2):
+        if i <= len(lines) and i not in covered:
+            run_start = run_start or i
+        elif run_start:
+            if any(line.strip() for line in lines[run_start - 1:i - 1]):
+                spans.append((run_start, i - 1, "<module>"))
+            run_start = None
+    chunks = [Chunk(rel, start, end, name, "\n".join(lines[start - 1:end])) for start, end, name in spans]
+    return sorted(chunks, key=lambda c: c.start)
+
+def chunk_file(project: Path, path: Path, symbols: List[Symbol] = ()) -> List[Chunk]:
+    rel = str(path.relative_to(project))
+    lines = get_workspace(project).read(path).splitlines()
+    if path.suffix == ".py":
+        return _python_chunks(rel, lines, list(symbols))
+    return _line_chunks(rel, lines)
+
+# -----------------------
+# BM25 index
+# -----------------------
+_IDENT = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CAMEL = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for ident in _IDENT.findall(text):
+        lower = ident.lower()
+        tokens.append(lower)
+        parts = [p.lower() for piece in ident.split("_") for p in _CAMEL.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+class ProjectIndex:
+    """BM25 index over the chunks of one project, refreshed per changed file."""
+
+    def __init__(self, project: Path):
+        self.project = project
+        self.files: Dict[str, Tuple[tuple, List[Chunk]]] = {}
+        self.tf: Dict[Tuple[str, int], Counter] = {}
+        self.df: Counter = Counter()
+        self.total_len = 0
+
+    def _drop(self, rel: str):
+        _, chunks = self.files.pop(rel)
+        for chunk in chunks:
+            tf = self.tf.pop((rel, chunk.start))
+            self.df.subtract(tf.keys())
+            self.total_len -= sum(tf.values())
+
+    def refresh(self, files: List[Path]):
+        symbols = get_symbol_index(self.project, files)
+        seen = set()
+        for path in files:
+            rel = str(path.relative_to(self.project))
+            seen.add(rel)
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            sig = (st.st_mtime_ns, st.st_size)
+            if rel in self.files:
+                if self.files[rel][0] == sig:
+                    continue
+                self._drop(rel)
+            chunks = chunk_file(self.project, path, symbols.symbols_in(rel))
+            self.files[rel] = (sig, chunks)
+            for chunk in chunks:
+                tf = Counter(tokenize(f"{chunk.path} {chunk.name}\n{chunk.text}"))
+                self.tf[(rel, chunk.start)] = tf
+                self.df.update(tf.keys())
+                self.total_len += sum(tf.values())
+        for rel in set(self.files) - seen:
+            self._drop(rel)
+
+    def chunks(self) -> List[Chunk]:
+        return [chunk for _, chunks in self.files.values() for chunk in chunks]
+
+    def score(self, query: str) -> Dict[Tuple[str, int], float]:
+        n = len(self.tf) or 1
+        avg_len = self.total_len / n or 1.0
+        terms = set(tokenize(query))
+        scores = {}
+        for key, tf in self.tf.items():
+            length = sum(tf.values())
+            s = 0.0
+            for term in terms:
+                f = tf.get(term)
+                if not f:
+                    continue
+                idf = math.log(1 + (n - self.df[term] + 0.5) / (self.df[term] + 0.5))
+                s += idf * f * (BM25_K1 + 1) / (f + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+            scores[key] = s
+        return scores
+
+_indexes: Dict[Path, ProjectIndex] = {}
+
+def get_index(project: Path, files: List[Path]) -> ProjectIndex:
+    key = project.resolve()
+    if key not in _indexes:
+        _indexes[key] = ProjectIndex(project)
+    index = _indexes[key]
+    index.refresh(files)
+    return index
+
+# -----------------------
+# Context rendering
+# -----------------------
+def build_context(project: Path, files: List[Path], query: str, budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """Render the most relevant project code for `query` within `budget` tokens.
+
+    Files are included whole when they fit; otherwise only their best-matching
+    functions/classes are shown and the file is marked as partial.
+    """
+    index = get_index(project, files)
+    scores = index.score(query)
+    ranked = sorted(index.chunks(), key=lambda c: (-scores.get((c.path, c.start), 0.0), c.path, c.start))
+    selected: Dict[str, List[Chunk]] = {}
+    full_files = set()
+    file_rank: Dict[str, int] = {}
+    used = 0
+    for chunk in ranked:
+        if chunk.path in full_files:
+            continue
+        if chunk.path not in selected:
+            path = project / chunk.path
+            cost = estimate_tokens(get_workspace(project).read(path)) if path.exists() else 0
+            if used + cost <= budget:
+                full_files.add(chunk.path)
+                selected[chunk.path] = []
+                file_rank[chunk.path] = len(file_rank)
+                used += cost
+                continue
+        cost = estimate_tokens(chunk.text)
+        if used + cost > budget:
+            continue
+        selected.setdefault(chunk.path, []).append(chunk)
+        file_rank.setdefault(chunk.path, len(file_rank))
+        used += cost
+    parts = []
+    for rel in sorted(selected, key=file_rank.get):
+        if rel in full_files:
+            parts.append(f"=== {rel} ===\n{get_workspace(project).read(project / rel)}")
+            continue
+        chunks = sorted(selected[rel], key=lambda c: c.start)
+        body, last = [], 0
+        for chunk in chunks:
+            if chunk.start > last + 1:
+                body.append(f"# ... lines {last + 1}-{chunk.start - 1} omitted ...")
+            body.append(chunk.text)
+            last = chunk.end
+        total = max(c.end for c in index.files[rel][1])
+        if last < total:
+            body.append(f"# ... lines {last + 1}-{total} omitted ...")
+        shown = sum(c.end - c.start + 1 for c in chunks)
+        parts.append(f"=== {rel} (partial, {shown} of {total} lines shown) ===\n" + "\n".join(body))
+    omitted = len(index.files) - len(selected)
+    if omitted:
+        parts.append(f"(+{omitted} less relevant file(s) omitted to fit the context budget)")
+    return "\n".join(parts)
@@ -0,0 +1,162 @@
+# discovery.py
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# -----------------------
+# Config
+# -----------------------
+# Never descended into, whatever .gitignore says: VCS metadata, caches,
+# virtualenvs and vendored packages.
+PRUNED_DIRS = {".git", ".hg", ".svn", "__pycache__", ".pytest_cache", ".mypy_cache", ".ruff_cache",
+               ".tox", ".nox", ".venv", "venv", "node_modules", "site-packages", ".agent_cache"}
+PRUNED_DIRS |= set(filter(None, os.getenv("DISCOVERY_PRUNE", "").split(",")))
+# Larger files are generated or vendored more often than not, and would not
+# fit a prompt anyway.
+MAX_FILE_BYTES = int(os.getenv("DISCOVERY_MAX_FILE_KB", 256)) * 1024
+RESPECT_GITIGNORE = os.getenv("DISCOVERY_GITIGNORE", "1") != "0"
+
+Stamp = Tuple[int, int, int]
+
+def stamp(st: os.stat_result) -> Stamp:
+    # The inode catches a file replaced within one mtime tick, which is how
+    # apply_fixes writes (rename to .bak, then a fresh file).
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+# -----------------------
+# .gitignore
+# -----------------------
+@dataclass
+class Rule:
+    regex: "re.Pattern"
+    base: str  # directory of the .gitignore, relative to the walk root ("" at the top)
+    negate: bool
+    dir_only: bool
+
+def _translate(pattern: str) -> str:
+    out, i = [], 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                out.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]")
+                i = end
+        elif c == "\\" and i + 1 < len(pattern):
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+def parse_gitignore(text: str, base: str = "") -> List[Rule]:
+    rules = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate or line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        # A slash anywhere but the end anchors the pattern to the .gitignore's directory.
+        anchored = "/" in line
+        body = _translate(line.lstrip("/"))
+        regex = re.compile(body if anchored else f"(?:.*/)?{body}")
+        rules.append(Rule(regex, base, negate, dir_only))
+    return rules
+
+def ignored(rules: Iterable[Rule], rel: str, is_dir: bool) -> bool:
+    # Last matching rule wins, and rules from deeper .gitignore files come later.
+    result = False
+    for rule in rules:
+        if rule.dir_only and not is_dir:
+            continue
+        if rule.base:
+            if not rel.startswith(rule.base + "/"):
+                continue
+            path = rel[len(rule.base) + 1:]
+        else:
+            path = rel
+        if rule.regex.fullmatch(path):
+            result = not rule.negate
+    return result
+
+# -----------------------
+# Walking
+# -----------------------
+@dataclass
+class Listing:
+    files: List[Path] = field(default_factory=list)  # relative to the root
+    # Every directory walked and .gitignore read; the listing is stale once any stamp changes.
+    stamps: Dict[Path, Stamp] = field(default_factory=dict)
+    skipped_large: List[Path] = field(default_factory=list)
+
+def _is_virtualenv(path: str) -> bool:
+    return os.path.exists(os.path.join(path, "pyvenv.cfg"))
+
+def walk(root: Path, suffixes: Optional[Iterable[str]] = None, max_bytes: int = MAX_FILE_BYTES) -> Listing:
+    """Files under `root` with one of `suffixes`, skipping ignored and oversized ones.
+
+    Pruned and git-ignored directories are never entered, so a vendored tree
+    costs one directory entry rather than a full traversal.
+    """
+    suffixes = set(suffixes) if suffixes is not None else None
+    listing = Listing()
+    pending: List[Tuple[Path, str, List[Rule]]] = [(root, "", [])]
+    while pending:
+        directory, rel_dir, rules = pending.pop()
+        try:
+            listing.stamps[directory] = stamp(directory.stat())
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError:
+            continue
+        if RESPECT_GITIGNORE and any(e.name == ".gitignore" for e in entries):
+            gitignore = directory / ".gitignore"
+            try:
+                listing.stamps[gitignore] = stamp(gitignore.stat())
+                rules = rules + parse_gitignore(gitignore.read_text(encoding="utf-8", errors="replace"), rel_dir)
+            except OSError:
+                pass
+        for entry in entries:
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name in PRUNED_DIRS or ignored(rules, rel, True) or _is_virtualenv(entry.path):
+                    continue
+                pending.append((Path(entry.path), rel, rules))
+            elif entry.is_file():
+                if suffixes is not None and Path(entry.name).suffix not in suffixes:
+                    continue
+                if ignored(rules, rel, False):
+                    continue
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue
+                if max_bytes and size > max_bytes:
+                    listing.skipped_large.append(Path(rel))
+                    continue
+                listing.files.append(Path(rel))
+    listing.files.sort()
+    return listing
@@ -0,0 +1,110 @@
+# failure_memo.py
+import os
+import re
+import json
+import time
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from test_results import TestRun
+
+# -----------------------
+# Config
+# -----------------------
+MEMO_DIR = Path(os.getenv("FAILURE_MEMO_DIR", ".agent_cache/failures"))
+MEMO_ENABLED = os.getenv("FAILURE_MEMO", "1") != "0"
+
+# "tests/test_logs.py:14: in test_get_metrics_endpoint"
+_FRAME = re.compile(r"^\s*([\w./\\-]+\.\w+):\d+: in (\S+)", re.M)
+# "E   ModuleNotFoundError: No module named 'x'" / "E   assert 0 > 0"
+_ERROR = re.compile(r"^E\s+(?:([A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt|Warning))\b|(assert)\b)", re.M)
+# Addresses, numbers and temp paths change between runs without the failure changing.
+_VOLATILE = re.compile(r"0x[0-9a-f]+|\d+(?:\.\d+)?|/tmp/\S+")
+
+# -----------------------
+# Fingerprints
+# -----------------------
+def _exception_type(text: str) -> str:
+    match = _ERROR.search(text)
+    if not match:
+        return ""
+    return match.group(1) or "AssertionError"
+
+def _location(text: str) -> str:
+    # Innermost frame, by file and function: line numbers move with every edit.
+    frames = _FRAME.findall(text)
+    return "::".join(frames[-1]) if frames else ""
+
+def signature_parts(result: TestRun) -> List[str]:
+    if result.timed_out:
+        return ["<timeout>"]
+    if result.failures:
+        return sorted(f"{c.nodeid}|{_exception_type(c.trace) or c.outcome}|{_location(c.trace)}"
+                      for c in result.failures)
+    if result.passed:
+        return []
+    # No structured failures (collection errors, npm, mvn): fall back to the
+    # error lines of the console output with volatile values masked.
+    errors = [_VOLATILE.sub("#", line.strip()) for line in result.output.splitlines() if line.startswith("E ")]
+    return [f"exit={result.exit_code}", _location(result.output), *errors[-5:]]
+
+def failure_signature(result: TestRun) -> str:
+    """Stable hash of which tests fail, with which exception, where; "" when the run passed."""
+    parts = signature_parts(result)
+    if not parts:
+        return ""
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+# -----------------------
+# Memo
+# -----------------------
+class FailureMemo:
+    """On-disk record of failure signatures, their analysis and the fix that resolved them."""
+
+    def __init__(self, root: Path, enabled: bool = True):
+        self.root = root
+        self.enabled = enabled
+        self.stats: Dict[str, int] = {"reused": 0, "analyzed": 0, "loops": 0, "resolved": 0}
+
+    def _path(self, project: str, signature: str) -> Path:
+        return self.root / project / f"{signature}.json"
+
+    def get(self, project: str, signature: str) -> Optional[Dict[str, Any]]:
+        if not (self.enabled and signature):
+            return None
+        try:
+            return json.loads(self._path(project, signature).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, project: str, signature: str, entry: Dict[str, Any]):
+        path = self._path(project, signature)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def record_analysis(self, project: str, signature: str, parts: List[str], analysis: str):
+        if not (self.enabled and signature):
+            return
+        entry = self.get(project, signature) or {"created": time.time(), "failures": parts}
+        entry.update(analysis=analysis, updated=time.time())
+        self._write(project, signature, entry)
+
+    def record_resolution(self, project: str, signature: str, fix: str):
+        if not (self.enabled and signature):
+            return
+        entry = self.get(project, signature)
+        if entry is None:
+            return
+        entry.update(resolved_by=fix, updated=time.time())
+        self._write(project, signature, entry)
+        self.stats["resolved"] += 1
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"Failure memo: {s['reused']} analyses reused, {s['analyzed']} new, "
+                f"{s['loops']} loops detected, {s['resolved']} resolutions recorded")
+
+memo = FailureMemo(MEMO_DIR, MEMO_ENABLED)
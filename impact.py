@@ -0,0 +1,106 @@
+# impact.py
+import ast
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+# -----------------------
+# Static import graph
+# -----------------------
+# path -> ((mtime_ns, size), imported module names)
+_import_cache: Dict[Path, tuple] = {}
+
+def module_name(project: Path, path: Path) -> str:
+    parts = list(path.relative_to(project).with_suffix("").parts)
+    if parts and parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+def is_test_file(path: Path) -> bool:
+    name = path.name
+    return name.endswith(".py") and (name.startswith("test") or name.endswith("_test.py"))
+
+def module_imports(project: Path, path: Path) -> List[str]:
+    st = path.stat()
+    sig = (st.st_mtime_ns, st.st_size)
+    cached = _import_cache.get(path)
+    if cached and cached[0] == sig:
+        return cached[1]
+    try:
+        tree = ast.parse(path.read_text(encoding="utf-8", errors="replace"), filename=str(path))
+    except SyntaxError:
+        # A file that does not parse cannot be analysed; treat it as importing nothing
+        # and let the full suite catch the breakage.
+        tree = ast.Module(body=[], type_ignores=[])
+    package = module_name(project, path).split(".")
+    if path.name != "__init__.py":
+        package = package[:-1]
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[:len(package) - node.level + 1]
+                prefix = ".".join(base + ([node.module] if node.module else []))
+            else:
+                prefix = node.module or ""
+            names.append(prefix)
+            names.extend(f"{prefix}.{alias.name}" if prefix else alias.name for alias in node.names)
+    _import_cache[path] = (sig, names)
+    return names
+
+def build_import_graph(project: Path, files: Iterable[Path]) -> Dict[str, Set[str]]:
+    modules = {module_name(project, f): f for f in files if f.suffix == ".py"}
+    graph: Dict[str, Set[str]] = {}
+    for mod, path in modules.items():
+        deps = set()
+        for name in module_imports(project, path):
+            # "import app.models" also executes app/__init__.py, so every
+            # known package prefix of the imported name is a dependency.
+            parts = name.split(".")
+            for i in range(1, len(parts) + 1):
+                candidate = ".".join(parts[:i])
+                if candidate in modules and candidate != mod:
+                    deps.add(candidate)
+        graph[mod] = deps
+    return graph
+
+def _reachable(graph: Dict[str, Set[str]], roots: Iterable[str]) -> Set[str]:
+    seen: Set[str] = set()
+    stack = list(roots)
+    while stack:
+        mod = stack.pop()
+        if mod in seen:
+            continue
+        seen.add(mod)
+        stack.extend(graph.get(mod, ()))
+    return seen
+
+def test_dependencies(project: Path, files: List[Path]) -> Dict[Path, Set[str]]:
+    """Map each test file to every project module it can reach, conftest.py included."""
+    graph = build_import_graph(project, files)
+    conftests = [f for f in files if f.name == "conftest.py"]
+    deps = {}
+    for test in files:
+        if not is_test_file(test):
+            continue
+        roots = [module_name(project, test)]
+        roots += [module_name(project, c) for c in conftests if c.parent in test.parents]
+        deps[test] = _reachable(graph, roots)
+    return deps
+
+def affected_tests(project: Path, files: List[Path], changed: Iterable[str]) -> Optional[List[str]]:
+    """Test files (relative paths) affected by the changed files.
+
+    Returns None when the change cannot be analysed statically (non-Python
+    files, deleted modules) and the whole suite should run.
+    """
+    changed_modules = set()
+    for rel in changed:
+        path = project / rel
+        if path.suffix != ".py" or not path.exists():
+            return None
+        changed_modules.add(module_name(project, path))
+    selected = [test for test, reached in test_dependencies(project, files).items()
+                if reached & changed_modules]
+    return sorted(str(t.relative_to(project)) for t in selected)
@@ -0,0 +1,128 @@
+# llm_cache.py
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional
+
+# -----------------------
+# Config
+# -----------------------
+CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", ".agent_cache/llm"))
+CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", 256)) * 1024 * 1024)
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+
+# -----------------------
+# Response cache
+# -----------------------
+class LLMCache:
+    """On-disk cache of LLM responses keyed by model, temperature and prompt hash.
+
+    Entries are evicted least-recently-used first once the cache grows past
+    `max_bytes`; a hit bumps the entry's mtime, which is what LRU order uses.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, ttl: float, enabled: bool = True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "bypassed": 0}
+        self._size: Optional[int] = None
+
+    @staticmethod
+    def make_key(model: str, temperature: float, prompt: str, variant: int = 0) -> str:
+        # `variant` tells apart deliberately repeated samples of one prompt.
+        digest = hashlib.sha256()
+        digest.update(f"{model}\0{temperature!r}\0".encode("utf-8"))
+        if variant:
+            digest.update(f"variant={variant}\0".encode("utf-8"))
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            self.stats["bypassed"] += 1
+            return None
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.stats["misses"] += 1
+            return None
+        if self.ttl and time.time() - entry.get("created", 0) > self.ttl:
+            self._remove(path)
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats["hits"] += 1
+        return entry["response"]
+
+    def put(self, key: str, response: str, **meta):
+        if not self.enabled:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({"created": time.time(), "response": response, **meta}, ensure_ascii=False)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, path)
+        if self._size is None:
+            self._size = self._disk_usage()
+        else:
+            self._size += len(data.encode("utf-8"))
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        for path in self.root.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            yield path, st
+
+    def _disk_usage(self) -> int:
+        return sum(st.st_size for _, st in self._entries())
+
+    def _remove(self, path: Path):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+    def evict(self):
+        # Rescan instead of trusting the running total: other agent processes
+        # (see --jobs) share the same directory.
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime)
+        total = sum(st.st_size for _, st in entries)
+        target = int(self.max_bytes * 0.9)
+        now = time.time()
+        for path, st in entries:
+            expired = self.ttl and now - st.st_mtime > self.ttl
+            if total <= target and not expired:
+                break
+            self._remove(path)
+            total -= st.st_size
+            self.stats["evicted"] += 1
+        self._size = total
+
+    def summary(self) -> str:
+        s = self.stats
+        lookups = s["hits"] + s["misses"]
+        rate = 100.0 * s["hits"] / lookups if lookups else 0.0
+        if not self.enabled:
+            return f"LLM cache: disabled ({s['bypassed']} calls bypassed)"
+        return (f"LLM cache: {s['hits']} hits, {s['misses']} misses ({rate:.0f}% hit rate), "
+                f"{s['expired']} expired, {s['evicted']} evicted")
+
+cache = LLMCache(CACHE_DIR, CACHE_MAX_BYTES, CACHE_TTL, CACHE_ENABLED)
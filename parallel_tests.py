@@ -0,0 +1,186 @@
+# parallel_tests.py
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import subprocess
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List
+
+import sharding
+from test_results import parse_junit
+
+# Same suites and commands as tests.py, which runs them one after another.
+TEST_CONFIGS = {
+    "flask-easy": "python -m pytest",
+    "flask-intermediate": "python -m pytest",
+    "flask-hard": "flask --app manage.py test",
+}
+BASE_DIR = Path(__file__).parent
+PROJECTS_DIR = BASE_DIR / "projects"
+REPORT_DIR = BASE_DIR / ".agent_runs" / "test-reports"
+MAX_OUTPUT_TAIL = 4000
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", 600))
+# Per-suite wall times of the last serial (-j1) run, the baseline for speedups.
+SERIAL_TIMINGS = REPORT_DIR / "serial-timings.json"
+
+# -----------------------
+# Running
+# -----------------------
+def run_suite(project: str, command: str, report_dir: Path, shards: int = 1) -> Dict[str, Any]:
+    report = report_dir / f"{project}.xml"
+    log = report_dir / f"{project}.log"
+    report.unlink(missing_ok=True)
+    if shards > 1 and command.endswith("-m pytest"):
+        result = run_sharded(project, command, report_dir, shards)
+        if result is not None:
+            return result
+    # Every project's pytest.ini writes unit.xml; PYTEST_ADDOPTS comes after
+    # the ini addopts, so this --junitxml wins, for `flask ... test` as well.
+    env = dict(os.environ, PYTEST_ADDOPTS=f"{os.getenv('PYTEST_ADDOPTS', '')} --junitxml={report}".strip())
+    start = time.perf_counter()
+    with open(log, "w", encoding="utf-8") as out:
+        try:
+            proc = subprocess.run(shlex.split(command), cwd=PROJECTS_DIR / project, env=env,
+                                  stdout=out, stderr=subprocess.STDOUT, text=True)
+            exit_code = proc.returncode
+        except OSError as e:
+            out.write(f"could not start {command!r}: {e}\n")
+            exit_code = 127
+    return {"project": project, "command": command, "exit_code": exit_code,
+            "wall": time.perf_counter() - start, "report": report, "log": log}
+
+def run_sharded(project: str, command: str, report_dir: Path, shards: int):
+    # Only plain pytest suites can be split by node id; `flask ... test` picks its own paths.
+    start = time.perf_counter()
+    run = sharding.run_shards(PROJECTS_DIR / project, shards, report_dir / f"{project}-shards",
+                              timeout=SHARD_TIMEOUT, label=project)
+    if run is None:
+        return None
+    report = report_dir / f"{project}.xml"
+    log = report_dir / f"{project}.log"
+    sharding.merge_junit(run.reports, report, name=project)
+    log.write_text(run.output, encoding="utf-8")
+    exit_code = 124 if run.timed_out else run.exit_code
+    return {"project": project, "command": f"{command} ({len(run.reports)} shards)", "exit_code": exit_code,
+            "wall": time.perf_counter() - start, "report": report, "log": log}
+
+def run_all(configs: Dict[str, str], jobs: int, report_dir: Path, shards: int = 1) -> List[Dict[str, Any]]:
+    # The suites are separate processes already; threads only wait on them.
+    report_dir.mkdir(parents=True, exist_ok=True)
+    results = []
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(run_suite, p, c, report_dir, shards) for p, c in configs.items()]
+        for future in as_completed(futures):
+            result = future.result()
+            # Recorded durations balance the next --shards run.
+            project_dir = PROJECTS_DIR / result["project"]
+            sharding.record_durations(project_dir, {c.nodeid: c.duration
+                                                    for c in parse_junit([result["report"]], project_dir)})
+            print(f"\n{'=' * 80}\n{result['project']} ({result['wall']:.1f}s, exit code {result['exit_code']})\n{'=' * 80}")
+            print(result["log"].read_text(encoding="utf-8", errors="replace"))
+            results.append(result)
+    return sorted(results, key=lambda r: list(configs).index(r["project"]))
+
+# -----------------------
+# Merged report
+# -----------------------
+def _suites(result: Dict[str, Any]) -> List[ET.Element]:
+    try:
+        root = ET.parse(result["report"]).getroot()
+    except (OSError, ET.ParseError):
+        # No report at all (crash before collection): record it as one error.
+        suite = ET.Element("testsuite", tests="1", failures="0", errors="1", skipped="0")
+        case = ET.SubElement(suite, "testcase", classname="", name="run")
+        tail = result["log"].read_text(encoding="utf-8", errors="replace")[-MAX_OUTPUT_TAIL:]
+        error = ET.SubElement(case, "error", message=f"no JUnit report (exit code {result['exit_code']})")
+        error.text = tail
+        return [suite]
+    return [root] if root.tag == "testsuite" else list(root.iter("testsuite"))
+
+def merge_reports(results: List[Dict[str, Any]], total_wall: float) -> ET.Element:
+    merged = ET.Element("testsuites", name="projects")
+    totals = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0}
+    for result in results:
+        for suite in _suites(result):
+            suite.set("name", result["project"])
+            suite.set("time", f"{result['wall']:.3f}")  # wall time of the whole run, collection included
+            properties = suite.find("properties")
+            if properties is None:
+                properties = ET.Element("properties")
+                suite.insert(0, properties)
+            for name, value in (("project", result["project"]), ("command", result["command"]),
+                                ("exit_code", result["exit_code"]), ("wall_time", f"{result['wall']:.3f}")):
+                ET.SubElement(properties, "property", name=name, value=str(value))
+            for case in suite.iter("testcase"):
+                # Keep test ids unique across projects that share module names.
+                case.set("classname", ".".join(filter(None, [result["project"], case.get("classname", "")])))
+            for key in totals:
+                totals[key] += int(suite.get(key, 0) or 0)
+            merged.append(suite)
+    for key, value in totals.items():
+        merged.set(key, str(value))
+    merged.set("time", f"{total_wall:.3f}")
+    return merged
+
+def load_serial_timings() -> Dict[str, float]:
+    try:
+        return json.loads(SERIAL_TIMINGS.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def save_serial_timings(results: List[Dict[str, Any]]):
+    timings = {**load_serial_timings(), **{r["project"]: round(r["wall"], 3) for r in results}}
+    SERIAL_TIMINGS.parent.mkdir(parents=True, exist_ok=True)
+    SERIAL_TIMINGS.write_text(json.dumps(timings, indent=2), encoding="utf-8")
+
+def print_summary(results: List[Dict[str, Any]], total_wall: float, serial: bool):
+    print(f"\n{'=' * 80}\nTest Summary\n{'=' * 80}")
+    for r in results:
+        status = "PASSED" if r["exit_code"] == 0 else "FAILED"
+        print(f"{r['project']:<22} {status:<7} {r['wall']:7.1f}s")
+    if serial:
+        print(f"Total wall time: {total_wall:.1f}s (serial; stored as the baseline for later runs)")
+        return
+    # Suites timed while running concurrently compete for CPU, so their sum
+    # overstates the serial time; compare with a stored -j1 run instead.
+    baseline = load_serial_timings()
+    if all(r["project"] in baseline for r in results):
+        serial_wall = sum(baseline[r["project"]] for r in results)
+        print(f"Total wall time: {total_wall:.1f}s (serial baseline {serial_wall:.1f}s, "
+              f"speedup {serial_wall / total_wall if total_wall else 1.0:.2f}x)")
+    else:
+        print(f"Total wall time: {total_wall:.1f}s (no serial baseline yet; run once with -j1 to record one)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run every project's test suite concurrently")
+    parser.add_argument("--jobs", "-j", type=int, default=min(len(TEST_CONFIGS), os.cpu_count() or 1),
+                        help="suites to run at once (1 runs them serially)")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="split each pytest suite over this many processes, balanced by recorded durations")
+    parser.add_argument("--project", action="append", default=[], help="only run these projects")
+    parser.add_argument("--junitxml", type=Path, default=REPORT_DIR / "merged.xml",
+                        help="where to write the merged JUnit report")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configs = {p: c for p, c in TEST_CONFIGS.items() if not args.project or p in args.project}
+    start = time.perf_counter()
+    results = run_all(configs, max(1, args.jobs), REPORT_DIR, args.shards)
+    total_wall = time.perf_counter() - start
+    args.junitxml.parent.mkdir(parents=True, exist_ok=True)
+    ET.ElementTree(merge_reports(results, total_wall)).write(args.junitxml, encoding="utf-8", xml_declaration=True)
+    serial = args.jobs <= 1 and args.shards <= 1
+    if serial:
+        save_serial_timings(results)
+    print_summary(results, total_wall, serial)
+    print(f"Merged JUnit report: {args.junitxml}")
+    return 0 if all(r["exit_code"] == 0 for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
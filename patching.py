@@ -0,0 +1,104 @@
+# patching.py
+import difflib
+from typing import List, Optional, Tuple
+
+from unidiff import PatchSet
+from unidiff.errors import UnidiffParseError
+
+FUZZY_THRESHOLD = 0.8
+
+# A hunk is (1-based source start hint, old lines, new lines); lines keep no newline.
+Hunk = Tuple[int, List[str], List[str]]
+
+class PatchError(Exception):
+    pass
+
+# -----------------------
+# Parsing
+# -----------------------
+def _parse_strict(diff: str, path: str) -> List[Hunk]:
+    if not diff.lstrip().startswith("---"):
+        diff = f"--- a/{path}\n+++ b/{path}\n{diff}"
+    if not diff.endswith("\n"):
+        diff += "\n"
+    hunks = []
+    for patched_file in PatchSet(diff):
+        for hunk in patched_file:
+            old = [l.value.rstrip("\n") for l in hunk if l.line_type in (" ", "-")]
+            new = [l.value.rstrip("\n") for l in hunk if l.line_type in (" ", "+")]
+            hunks.append((hunk.source_start, old, new))
+    return hunks
+
+def _parse_lenient(diff: str) -> List[Hunk]:
+    # Models often get the @@ line counts wrong; ignore them and trust the
+    # line prefixes instead.
+    hunks: List[Hunk] = []
+    current = None
+    for line in diff.splitlines():
+        if line.startswith("@@"):
+            start = 1
+            try:
+                start = int(line.split()[1].split(",")[0].lstrip("-")) or 1
+            except (IndexError, ValueError):
+                pass
+            current = (start, [], [])
+            hunks.append(current)
+        elif current is None or line.startswith(("---", "+++", "\\")):
+            continue
+        elif line.startswith("-"):
+            current[1].append(line[1:])
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+        else:
+            text = line[1:] if line.startswith(" ") else line
+            current[1].append(text)
+            current[2].append(text)
+    return hunks
+
+def parse_hunks(diff: str, path: str = "file") -> List[Hunk]:
+    try:
+        hunks = _parse_strict(diff, path)
+    except UnidiffParseError:
+        hunks = []
+    return hunks or _parse_lenient(diff)
+
+# -----------------------
+# Fuzzy application
+# -----------------------
+def _find(lines: List[str], old: List[str], hint: int) -> Optional[int]:
+    n = len(old)
+    if n == 0:
+        return min(max(hint - 1, 0), len(lines))
+    candidates = range(len(lines) - n + 1)
+    by_distance = sorted(candidates, key=lambda i: abs(i - (hint - 1)))
+    # 1. exact, nearest to the line number the hunk claims
+    for i in by_distance:
+        if lines[i:i + n] == old:
+            return i
+    # 2. ignoring whitespace differences
+    stripped = [l.strip() for l in old]
+    for i in by_distance:
+        if [l.strip() for l in lines[i:i + n]] == stripped:
+            return i
+    # 3. best similar block above the threshold
+    best, best_ratio = None, FUZZY_THRESHOLD
+    target = "\n".join(stripped)
+    for i in by_distance:
+        ratio = difflib.SequenceMatcher(None, "\n".join(l.strip() for l in lines[i:i + n]), target).ratio()
+        if ratio > best_ratio:
+            best, best_ratio = i, ratio
+    return best
+
+def apply_diff(original: str, diff: str, path: str = "file") -> str:
+    hunks = parse_hunks(diff, path)
+    if not hunks:
+        raise PatchError("no hunks found in diff")
+    lines = original.splitlines()
+    offset = 0
+    for number, (hint, old, new) in enumerate(hunks, 1):
+        at = _find(lines, old, hint + offset)
+        if at is None:
+            raise PatchError(f"hunk {number} does not match the current file")
+        lines[at:at + len(old)] = new
+        offset += len(new) - len(old)
+    return "\n".join(lines) + ("\n" if original.endswith("\n") or not original else "")
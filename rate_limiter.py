@@ -0,0 +1,219 @@
+# rate_limiter.py
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+from typing import Any, Callable, Dict, Optional
+
+# -----------------------
+# Config
+# -----------------------
+RATE_LIMIT_HEADROOM = float(os.getenv("RATE_LIMIT_HEADROOM", 0.9))
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", 5))
+COMPLETION_ESTIMATE = int(os.getenv("LLM_COMPLETION_ESTIMATE", 800))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Lower value = served first when callers are queued on the limits.
+PRIORITY_FIX = 0
+PRIORITY_CODE = 1
+PRIORITY_ANALYSIS = 2
+PRIORITY_SUMMARY = 3
+
+def retryable_errors() -> tuple:
+    # Imported on first call: openai is slow to import and agent.py loads this module eagerly.
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    return RateLimitError, (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+def fetch_key_limits() -> Dict[str, Optional[int]]:
+    # Same endpoint check_usage.py reports on.
+    api_base = os.getenv("OPENAI_API_BASE")
+    base_url = api_base.replace("/v1", "") if api_base else ""
+    if not base_url:
+        return {}
+    import httpx
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"}
+    try:
+        info = httpx.get(f"{base_url}/key/info", headers=headers, timeout=5).json().get("info", {})
+    except (httpx.HTTPError, ValueError, AttributeError):
+        return {}
+    return {"tpm_limit": info.get("tpm_limit"), "rpm_limit": info.get("rpm_limit")}
+
+def estimate_tokens(prompt: str) -> int:
+    return len(prompt) // 4 + 1 + COMPLETION_ESTIMATE
+
+# -----------------------
+# Token buckets
+# -----------------------
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)  # oversized calls wait for a full bucket
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+class RateLimiter:
+    """Client-side admission for LLM calls against the key's RPM/TPM limits.
+
+    Callers wait in priority order; a 429 pauses every caller for the
+    backoff delay.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.config_lock = threading.Lock()
+        self.waiting = []
+        self.seq = itertools.count()
+        self.requests: Optional[TokenBucket] = None
+        self.tokens: Optional[TokenBucket] = None
+        self.paused_until = 0.0
+        self.configured = False
+        self.stats = {"calls": 0, "waited": 0.0, "retries": 0}
+
+    def configure(self):
+        with self.config_lock:
+            if self.configured:
+                return
+            rpm = os.getenv("LLM_RPM_LIMIT")
+            tpm = os.getenv("LLM_TPM_LIMIT")
+            if not (rpm and tpm):
+                limits = fetch_key_limits()
+                rpm = rpm or limits.get("rpm_limit")
+                tpm = tpm or limits.get("tpm_limit")
+            # Parallel agent processes (--jobs) split the key's limits between them.
+            share = max(1, int(os.getenv("AGENT_RATE_SHARE", 1)))
+            with self.cond:
+                if rpm:
+                    self.requests = TokenBucket(float(rpm) * RATE_LIMIT_HEADROOM / share)
+                if tpm:
+                    self.tokens = TokenBucket(float(tpm) * RATE_LIMIT_HEADROOM / share)
+            self.configured = True
+
+    def summary(self) -> str:
+        limits = []
+        if self.requests:
+            limits.append(f"{self.requests.capacity:.0f} req/min")
+        if self.tokens:
+            limits.append(f"{self.tokens.capacity:.0f} tok/min")
+        return (f"Rate limiter ({', '.join(limits) or 'no limits known'}): {self.stats['calls']} calls, "
+                f"{self.stats['retries']} retries, {self.stats['waited']:.1f}s queued")
+
+    def _wait_time(self, estimated: int) -> float:
+        wait = self.paused_until - time.monotonic()
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(1))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(estimated))
+        return wait
+
+    def acquire(self, estimated: int, priority: int = PRIORITY_ANALYSIS):
+        self.configure()
+        start = time.monotonic()
+        with self.cond:
+            ticket = (priority, next(self.seq))
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    if self.waiting[0] == ticket:
+                        wait = self._wait_time(estimated)
+                        if wait <= 0:
+                            if self.requests:
+                                self.requests.take(1)
+                            if self.tokens:
+                                self.tokens.take(estimated)
+                            break
+                        self.cond.wait(timeout=wait)
+                    else:
+                        self.cond.wait(timeout=1.0)
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.cond.notify_all()
+        self.stats["calls"] += 1
+        self.stats["waited"] += time.monotonic() - start
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        # Correct the token bucket once the real usage is known.
+        if actual is None or not self.tokens:
+            return
+        with self.cond:
+            self.tokens.take(actual - estimated)
+            self.cond.notify_all()
+
+    def pause(self, delay: float):
+        with self.cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+def _retry_delay(attempt: int, error: Exception) -> float:
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        if retry_after:
+            return min(float(retry_after), BACKOFF_MAX) + random.uniform(0, 1)
+    except ValueError:
+        pass
+    # Full jitter keeps parallel callers from retrying in lockstep.
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def _total_tokens(resp) -> Optional[int]:
+    usage = getattr(resp, "usage", None)
+    return usage.total_tokens if usage is not None else None
+
+def call_with_limits(prompt: str, priority: int, call: Callable[[], Any]):
+    RateLimitError, retryable = retryable_errors()
+    estimated = estimate_tokens(prompt)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        limiter.acquire(estimated, priority)
+        try:
+            resp = call()
+        except retryable as e:
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+            delay = _retry_delay(attempt, e)
+            if isinstance(e, RateLimitError):
+                limiter.pause(delay)
+            limiter.stats["retries"] += 1
+            print(f"⏳ LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+        limiter.settle(estimated, _total_tokens(resp))
+        return resp
+
+async def call_with_limits_async(prompt: str, priority: int, call: Callable[[], Any]):
+    RateLimitError, retryable = retryable_errors()
+    estimated = estimate_tokens(prompt)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        await asyncio.to_thread(limiter.acquire, estimated, priority)
+        try:
+            resp = await call()
+        except retryable as e:
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+            delay = _retry_delay(attempt, e)
+            if isinstance(e, RateLimitError):
+                limiter.pause(delay)
+            limiter.stats["retries"] += 1
+            print(f"⏳ LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            continue
+        limiter.settle(estimated, _total_tokens(resp))
+        return resp
+
+limiter = RateLimiter()
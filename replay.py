@@ -0,0 +1,215 @@
+# replay.py
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from llm_cache import LLMCache
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# -----------------------
+# Config
+# -----------------------
+# LLM_RECORD=<cassette> appends every answer ask_llm sees; LLM_REPLAY=<cassette>
+# answers from the cassette without touching the network.
+RECORD_PATH = os.getenv("LLM_RECORD")
+REPLAY_PATH = os.getenv("LLM_REPLAY")
+
+# Prompts embed test durations, object addresses and the absolute location of
+# the projects; none of that should make a recorded answer miss.
+_VOLATILE = re.compile(r"\b\d+\.\d+s\b|0x[0-9a-fA-F]+")
+
+def normalize(prompt: str) -> str:
+    # Read the projects directory per call: benchmark.py points it at a scratch copy after import.
+    roots = {str(Path(os.getenv("AGENT_PROJECTS_DIR", "projects")).resolve()), str(Path("projects").resolve())}
+    for root in sorted(roots, key=len, reverse=True):
+        prompt = prompt.replace(root, "<projects>")
+    return _VOLATILE.sub("#", prompt)
+
+def replay_key(model: str, temperature: float, prompt: str, variant: int = 0) -> str:
+    return LLMCache.make_key(model, temperature, normalize(prompt), variant)
+
+# -----------------------
+# Cassettes
+# -----------------------
+class Cassette:
+    """JSONL file of recorded LLM exchanges.
+
+    Entries are indexed twice: by model, temperature, normalized prompt and
+    best-of-N variant, and by the request alone (no variant), which is all the
+    stub server can see. Repeated requests cycle through the answers recorded
+    for them.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.by_key: Dict[str, str] = {}
+        self.by_request: Dict[str, List[str]] = {}
+        self.served: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._index(entry)
+        except OSError:
+            pass
+
+    def _index(self, entry: Dict[str, Any]):
+        self.by_key[entry["key"]] = entry["response"]
+        self.by_request.setdefault(entry["request_key"], []).append(entry["response"])
+
+    def get(self, model: str, temperature: float, prompt: str, variant: int = 0) -> Optional[str]:
+        key = replay_key(model, temperature, prompt, variant)
+        with self.lock:
+            answer = self.by_key.get(key)
+            self.stats["hits" if answer is not None else "misses"] += 1
+            return answer
+
+    def get_for_request(self, model: str, temperature: float, prompt: str) -> Optional[str]:
+        request_key = replay_key(model, temperature, prompt)
+        with self.lock:
+            answers = self.by_request.get(request_key)
+            if not answers:
+                self.stats["misses"] += 1
+                return None
+            n = self.served.get(request_key, 0)
+            self.served[request_key] = n + 1
+            self.stats["hits"] += 1
+            return answers[n % len(answers)]
+
+    def record(self, model: str, temperature: float, prompt: str, response: str, variant: int = 0, **meta):
+        key = replay_key(model, temperature, prompt, variant)
+        entry = {"key": key, "request_key": replay_key(model, temperature, prompt), "variant": variant,
+                 "model": model, "temperature": temperature, "prompt": prompt, "response": response, **meta}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self.lock:
+            if key in self.by_key:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._index(entry)
+            self.stats["recorded"] += 1
+
+recorder = Cassette(RECORD_PATH) if RECORD_PATH else None
+player = Cassette(REPLAY_PATH) if REPLAY_PATH else None
+
+# -----------------------
+# Stub server
+# -----------------------
+STUB_LIMITS = {"tpm_limit": 10_000_000, "rpm_limit": 100_000}
+
+_JSON_FIELD = re.compile(r'^\s*"(\w+)":\s*([\["])', re.MULTILINE)
+
+def _fallback_answer(prompt: str) -> str:
+    # Unrecorded prompts still get a deterministic answer so a benchmark can
+    # run end to end; the miss count tells how far it strayed from the cassette.
+    # Prompts that ask for JSON get the fields of their example, left empty,
+    # so the structured paths are exercised rather than their parse fallbacks.
+    placeholder = f"(no recorded answer) {prompt[:80]}"
+    if "Respond in JSON" not in prompt:
+        return placeholder
+    fields = {name: [] if opening == "[" else placeholder for name, opening in _JSON_FIELD.findall(prompt)}
+    return json.dumps(fields)
+
+def make_handler(cassette: Optional[Cassette], latency: float, jitter: float, strict: bool):
+    # http.server is imported here: agent.py imports this module for the
+    # record/replay hooks and should not pay for the server.
+    from http.server import BaseHTTPRequestHandler
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload: Dict[str, Any]):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            # rate_limiter and check_usage.py read the key's limits here.
+            if self.path.rstrip("/").endswith("/key/info"):
+                self._send(200, {"info": {**STUB_LIMITS, "max_budget": None, "spend": 0}})
+            else:
+                self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            prompt = request["messages"][-1]["content"]
+            model = request.get("model", "")
+            temperature = request.get("temperature", 1.0)
+            answer = cassette.get_for_request(model, temperature, prompt) if cassette else None
+            if answer is None:
+                if strict:
+                    self._send(404, {"error": {"message": "prompt not in cassette", "type": "not_found"}})
+                    return
+                answer = _fallback_answer(prompt)
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            prompt_tokens = len(prompt) // 4 + 1
+            completion_tokens = len(answer) // 4 + 1
+            self._send(200, {
+                "id": f"stub-{time.time_ns()}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": answer}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+    return StubHandler
+
+def start_stub_server(cassette: Optional[Cassette] = None, port: int = 0, latency: float = 0.0,
+                      jitter: float = 0.0, strict: bool = False) -> "ThreadingHTTPServer":
+    """OpenAI-compatible server answering from `cassette`, in a daemon thread; port 0 picks a free one."""
+    from http.server import ThreadingHTTPServer
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(cassette, latency, jitter, strict))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve recorded LLM answers over an OpenAI-compatible API")
+    parser.add_argument("--cassette", help="JSONL cassette recorded with LLM_RECORD")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- seconds around the latency")
+    parser.add_argument("--strict", action="store_true", help="answer unrecorded prompts with 404")
+    args = parser.parse_args(argv)
+    cassette = Cassette(Path(args.cassette)) if args.cassette else None
+    server = start_stub_server(cassette, args.port, args.latency, args.jitter, args.strict)
+    print(f"Stub LLM server on http://127.0.0.1:{server.server_address[1]}/v1 "
+          f"({len(cassette.by_key) if cassette else 0} recorded answers)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        if cassette:
+            print(f"Served {cassette.stats['hits']} recorded answers, {cassette.stats['misses']} misses")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+# sandbox.py
+import os
+import shutil
+import tempfile
+import contextlib
+from pathlib import Path
+
+# -----------------------
+# Config
+# -----------------------
+SANDBOX_DIR = Path(os.getenv("SANDBOX_DIR", ".agent_cache/sandboxes"))
+
+# Source files are hardlinked into the sandbox: apply_fixes is the only thing
+# that writes them, and it replaces files by rename-then-write, which gives the
+# sandbox copy its own inode, so edits never reach the original project.
+# Everything else (templates, docs, config, data) may be opened for writing in
+# place by a test or the app, which would truncate the shared inode, so it is copied.
+HARDLINK_SUFFIXES = {".py", ".js", ".jsx", ".ts", ".tsx", ".java"}
+# Dependency trees are shared read-only through a symlink instead of walked.
+SHARED_DIRS = {"node_modules", "venv", ".venv", "env"}
+SKIPPED_DIRS = {".git", "__pycache__", ".pytest_cache", ".mypy_cache", ".ruff_cache", "target"}
+
+def _link_or_copy(src: str, dst: str):
+    if Path(src).suffix in HARDLINK_SUFFIXES:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass  # different filesystem, or links not supported
+    shutil.copy2(src, dst)
+
+def populate(project: Path, dest: Path):
+    for root, dirs, files in os.walk(project):
+        rel = Path(root).relative_to(project)
+        target = dest / rel
+        target.mkdir(parents=True, exist_ok=True)
+        for d in list(dirs):
+            if d in SKIPPED_DIRS:
+                dirs.remove(d)
+            elif d in SHARED_DIRS:
+                dirs.remove(d)
+                os.symlink(Path(root, d).resolve(), target / d, target_is_directory=True)
+        for name in files:
+            if name.endswith(".bak"):
+                continue
+            _link_or_copy(os.path.join(root, name), str(target / name))
+
+@contextlib.contextmanager
+def sandbox(project: Path):
+    """Scratch copy of `project` that shares unchanged source files with it."""
+    SANDBOX_DIR.mkdir(parents=True, exist_ok=True)
+    root = Path(tempfile.mkdtemp(prefix=f"{project.name}-", dir=SANDBOX_DIR))
+    dest = root / project.name
+    try:
+        populate(project, dest)
+        yield dest
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,156 @@
+# sharding.py
+import os
+import json
+import shlex
+import shutil
+import heapq
+import hashlib
+import statistics
+import subprocess
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from streaming import run_streaming
+
+# -----------------------
+# Config
+# -----------------------
+DURATIONS_DIR = Path(os.getenv("TEST_DURATIONS_DIR", ".agent_cache/durations"))
+COLLECT_TIMEOUT = 60
+# How every cold pytest run is started, sharded or not (agent.py uses it too):
+# the `pytest` on PATH, so a project virtualenv that is active wins.
+PYTEST_COMMAND = shlex.split(os.getenv("PYTEST_COMMAND", "pytest"))
+# Below this many tests per shard the extra interpreters cost more than they save.
+MIN_TESTS_PER_SHARD = int(os.getenv("MIN_TESTS_PER_SHARD", 2))
+
+# -----------------------
+# Recorded durations
+# -----------------------
+def _durations_path(project: Path) -> Path:
+    digest = hashlib.sha1(str(project.resolve()).encode("utf-8")).hexdigest()[:10]
+    return DURATIONS_DIR / f"{project.name}-{digest}.json"
+
+def load_durations(project: Path) -> Dict[str, float]:
+    try:
+        return json.loads(_durations_path(project).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def record_durations(project: Path, durations: Dict[str, float]):
+    if not durations:
+        return
+    path = _durations_path(project)
+    merged = {**load_durations(project), **durations}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(merged, indent=0, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+# -----------------------
+# Partitioning
+# -----------------------
+def collect_tests(project: Path, targets: Sequence[str] = ()) -> Optional[List[str]]:
+    """Test node ids pytest would run, or None when collection fails."""
+    try:
+        proc = subprocess.run([*PYTEST_COMMAND, "--collect-only", "-q", "-p", "no:cacheprovider",
+                               "-o", "addopts=", *targets],
+                              cwd=project, capture_output=True, text=True, timeout=COLLECT_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return None
+    if proc.returncode != 0:
+        return None
+    return [line.strip() for line in proc.stdout.splitlines() if "::" in line and not line.startswith(" ")]
+
+def partition(test_ids: List[str], durations: Dict[str, float], shards: int) -> List[List[str]]:
+    """Longest-first greedy split into `shards` groups of about equal recorded duration."""
+    known = [durations[t] for t in test_ids if t in durations]
+    default = statistics.median(known) if known else 1.0
+    cost = {t: durations.get(t, default) for t in test_ids}
+    heap = [(0.0, k, []) for k in range(shards)]
+    for test_id in sorted(test_ids, key=lambda t: -cost[t]):
+        load, k, members = heapq.heappop(heap)
+        members.append(test_id)
+        heapq.heappush(heap, (load + cost[test_id], k, members))
+    # Collection order within a shard keeps module fixtures together.
+    order = {t: i for i, t in enumerate(test_ids)}
+    groups = [sorted(members, key=order.get) for _, _, members in sorted(heap, key=lambda h: h[1])]
+    return [g for g in groups if g]
+
+def shard_env(project: Path, index: int, shards: int, report_dir: Path) -> Dict[str, str]:
+    # The Flask projects read TEST_DATABASE_URL in their TestingConfig. A
+    # configured file database is copied once per shard, so shards start from
+    # the same data without writing to one file; otherwise each shard gets
+    # its own in-memory database.
+    env = dict(os.environ, TEST_SHARD_INDEX=str(index), TEST_SHARD_COUNT=str(shards))
+    url = os.getenv("TEST_DATABASE_URL", "")
+    if url.startswith("sqlite:///") and ":memory:" not in url:
+        source = project / url[len("sqlite:///"):]  # relative paths are from the test's cwd
+        copy = (report_dir / f"shard-{index}.sqlite").resolve()
+        if source.is_file():
+            shutil.copy2(source, copy)
+        env["TEST_DATABASE_URL"] = f"sqlite:///{copy}"
+    else:
+        env["TEST_DATABASE_URL"] = url or "sqlite:///:memory:"
+    return env
+
+# -----------------------
+# Running
+# -----------------------
+@dataclass
+class ShardedRun:
+    output: str
+    exit_code: Optional[int]
+    reports: List[Path] = field(default_factory=list)
+    raw_bytes: int = 0
+    timed_out: bool = False
+
+def run_shards(project: Path, shards: int, report_dir: Path, targets: Sequence[str] = (),
+               timeout: float = 60, label: str = "") -> Optional[ShardedRun]:
+    """Run the suite as `shards` concurrent pytest processes, one JUnit report each.
+
+    Returns None when sharding does not apply (collection fails, or too few
+    tests); the caller then runs the suite as usual.
+    """
+    test_ids = collect_tests(project, targets)
+    if not test_ids or len(test_ids) < shards * MIN_TESTS_PER_SHARD:
+        return None
+    groups = partition(test_ids, load_durations(project), shards)
+    report_dir.mkdir(parents=True, exist_ok=True)
+
+    def run(index: int):
+        report = report_dir / f"shard-{index}.xml"
+        cmd = [*PYTEST_COMMAND, "-q", "-p", "no:cacheprovider", f"--junitxml={report}", *groups[index]]
+        return report, run_streaming(cmd, project, timeout, label=f"{label} shard {index + 1}/{len(groups)}",
+                                     env=shard_env(project, index, len(groups), report_dir))
+
+    with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+        runs = list(pool.map(run, range(len(groups))))
+    outputs = [f"--- shard {i + 1}/{len(groups)}: {len(groups[i])} tests ---\n{r.output}"
+               for i, (_, r) in enumerate(runs)]
+    codes = [r.exit_code for _, r in runs]
+    exit_code = None if None in codes else max(codes)
+    return ShardedRun("\n".join(outputs), exit_code, [report for report, _ in runs],
+                      sum(r.raw_bytes for _, r in runs), any(r.timed_out for _, r in runs))
+
+def merge_junit(reports: List[Path], dest: Path, name: str = "pytest"):
+    """Combine per-shard JUnit reports into a single <testsuite>."""
+    merged = ET.Element("testsuite", name=name)
+    totals = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0}
+    elapsed = 0.0
+    for report in reports:
+        try:
+            root = ET.parse(report).getroot()
+        except (OSError, ET.ParseError):
+            continue
+        for suite in ([root] if root.tag == "testsuite" else root.iter("testsuite")):
+            for key in totals:
+                totals[key] += int(suite.get(key, 0) or 0)
+            elapsed = max(elapsed, float(suite.get("time", 0) or 0))  # shards overlap in time
+            merged.extend(suite.iter("testcase"))
+    for key, value in totals.items():
+        merged.set(key, str(value))
+    merged.set("time", f"{elapsed:.3f}")
+    ET.ElementTree(merged).write(dest, encoding="utf-8", xml_declaration=True)
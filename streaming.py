@@ -0,0 +1,179 @@
+# streaming.py
+import io
+import os
+import re
+import time
+import queue
+import signal
+import threading
+import subprocess
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from compaction import Compactor
+
+# -----------------------
+# Config
+# -----------------------
+HEAD_LINES = int(os.getenv("TEST_OUTPUT_HEAD_LINES", 200))
+TAIL_LINES = int(os.getenv("TEST_OUTPUT_TAIL_LINES", 400))
+FAILURE_BYTES = int(os.getenv("TEST_OUTPUT_FAILURE_KB", 256)) * 1024
+MAX_LINE_CHARS = 8192
+KILL_GRACE = 5.0  # seconds to drain the pipes after a timeout kill
+TEST_PROGRESS = os.getenv("TEST_PROGRESS", "1") != "0"
+
+# Lines that belong to a failure report and are kept even from the middle of the output.
+FAILURE_START = re.compile(r"^=+ (FAILURES|ERRORS|short test summary info) =+$|^_{3,} .+ _{3,}$|^Traceback ")
+FAILURE_LINE = re.compile(r"^(E |FAILED |ERROR |\[ERROR\]|Tests run: .*Fail)|Error\b|Exception\b")
+SECTION = re.compile(r"^=+ .+ =+$")
+# pytest's "..F.  [ 40%]", Maven's "Tests run: ..." / "Running com.x.FooTest", jest's "PASS x.test.js".
+PROGRESS = re.compile(r"\[\s*\d+%\]$|^Tests run: |^Running \S+$|^(PASS|FAIL) \S+")
+
+# -----------------------
+# Bounded output
+# -----------------------
+class BoundedOutput:
+    """Keeps the head and tail of a line stream plus failure sections from the middle."""
+
+    def __init__(self, head: int = HEAD_LINES, tail: int = TAIL_LINES, failure_bytes: int = FAILURE_BYTES):
+        self.head_size = head
+        self.head: List[str] = []
+        self.tail: deque = deque(maxlen=tail)
+        self.failures: List[Tuple[int, str]] = []
+        self.failure_budget = failure_bytes
+        self.in_failure = False
+        self.count = 0
+
+    def append(self, line: str):
+        index = self.count
+        self.count += 1
+        if len(self.head) < self.head_size:
+            self.head.append(line)
+            return
+        if FAILURE_START.match(line):
+            self.in_failure = True
+        elif SECTION.match(line):
+            self.in_failure = False
+        if (self.in_failure or FAILURE_LINE.search(line)) and self.failure_budget > 0:
+            self.failures.append((index, line))
+            self.failure_budget -= len(line) + 1
+        self.tail.append((index, line))
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.head
+        tail_start = self.tail[0][0] if self.tail else self.count
+        last = len(self.head) - 1
+        for index, line in [f for f in self.failures if f[0] < tail_start] + list(self.tail):
+            if index - last > 1:
+                yield f"... ({index - last - 1} lines omitted) ..."
+            yield line
+            last = index
+
+class BoundedWriter(io.TextIOBase):
+    """Text stream (for redirect_stdout) that keeps only a BoundedOutput of what is written."""
+
+    def __init__(self):
+        self.out = BoundedOutput()
+        self.partial = ""
+        self.bytes_written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self.bytes_written += len(text.encode("utf-8", errors="replace"))
+        *lines, self.partial = (self.partial + text).split("\n")
+        for line in lines:
+            self.out.append(line)
+        # Same cap as _pump's readline: a runaway line without newlines is split.
+        while len(self.partial) > MAX_LINE_CHARS:
+            self.out.append(self.partial[:MAX_LINE_CHARS])
+            self.partial = self.partial[MAX_LINE_CHARS:]
+        return len(text)
+
+    def getvalue(self) -> str:
+        if self.partial:
+            self.out.append(self.partial)
+            self.partial = ""
+        return "\n".join(self.out)
+
+def compact_bounded(text: str, raw_bytes: int) -> str:
+    """Compact output that was already bounded elsewhere (the warm worker), as run_streaming would."""
+    compactor = Compactor(BoundedOutput())
+    for line in text.splitlines():
+        compactor.feed(line)
+    # Report the size of what the runner printed, not of the bounded copy.
+    compactor.bytes_in = raw_bytes
+    return compactor.result()
+
+# -----------------------
+# Runner
+# -----------------------
+@dataclass
+class StreamResult:
+    output: str
+    exit_code: Optional[int]
+    raw_bytes: int
+    timed_out: bool = False
+
+def _pump(stream, lines: "queue.Queue"):
+    # readline(n) caps a single runaway line instead of buffering all of it.
+    try:
+        for line in iter(lambda: stream.readline(MAX_LINE_CHARS), ""):
+            lines.put(line)
+    finally:
+        stream.close()
+        lines.put(None)
+
+def _kill(proc: subprocess.Popen):
+    # The runner is its own process group leader, so npm/mvn children die with it.
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (OSError, AttributeError):
+        proc.kill()
+
+def run_streaming(cmd: List[str], cwd: Path, timeout: float, label: str = "",
+                  env: Optional[Dict[str, str]] = None) -> StreamResult:
+    """Run `cmd`, compacting stdout and stderr as they arrive into bounded memory.
+
+    Progress lines are echoed live. On timeout the process group is killed and
+    whatever output arrived so far is kept.
+    """
+    out = BoundedOutput()
+    compactor = Compactor(out)
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                            errors="replace", start_new_session=True, env=env)
+    # Bounded, so readers block (and the child with them) instead of piling up lines.
+    lines: "queue.Queue" = queue.Queue(maxsize=1000)
+    readers = [threading.Thread(target=_pump, args=(stream, lines), daemon=True)
+               for stream in (proc.stdout, proc.stderr)]
+    for reader in readers:
+        reader.start()
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    open_streams = len(readers)
+    while open_streams:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 and not timed_out:
+            timed_out = True
+            _kill(proc)
+        if timed_out and remaining < -KILL_GRACE:
+            break  # a grandchild outside the process group still holds a pipe
+        try:
+            line = lines.get(timeout=max(remaining, 0.1) if not timed_out else 1.0)
+        except queue.Empty:
+            continue
+        if line is None:
+            open_streams -= 1
+            continue
+        compactor.feed(line)
+        if TEST_PROGRESS and PROGRESS.search(line.rstrip()):
+            print(f"   {label + ': ' if label else ''}{line.rstrip()}", flush=True)
+    exit_code = proc.wait()
+    output = compactor.result()
+    if timed_out:
+        output += f"\n⏳ Timed out after {timeout:.0f}s; output above is what arrived before the kill."
+        exit_code = None
+    return StreamResult(output, exit_code, compactor.bytes_in, timed_out)
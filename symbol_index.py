@@ -0,0 +1,224 @@
+# symbol_index.py
+import os
+import re
+import ast
+import json
+import hashlib
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from impact import module_imports
+from workspace import get_workspace
+
+# -----------------------
+# Config
+# -----------------------
+SYMBOL_INDEX_DIR = Path(os.getenv("SYMBOL_INDEX_DIR", ".agent_cache/symbols"))
+INDEX_VERSION = 1
+HTTP_METHODS = {"get", "post", "put", "patch", "delete"}
+
+# -----------------------
+# Symbols
+# -----------------------
+@dataclass
+class Symbol:
+    name: str  # qualified within the file, e.g. "LogProcessor.process_log"
+    kind: str  # "class", "function" or "method"
+    path: str
+    start: int  # 1-based, includes decorators
+    end: int
+    parent: Optional[str] = None
+    routes: List[str] = field(default_factory=list)  # e.g. ["POST /logs"]
+
+def _routes(node) -> List[str]:
+    # Flask-style handlers: @bp.route("/x", methods=[...]) and @app.get("/x").
+    routes = []
+    for dec in node.decorator_list:
+        if not (isinstance(dec, ast.Call) and isinstance(dec.func, ast.Attribute)):
+            continue
+        attr = dec.func.attr
+        if attr != "route" and attr not in HTTP_METHODS:
+            continue
+        if not dec.args or not isinstance(dec.args[0], ast.Constant) or not isinstance(dec.args[0].value, str):
+            continue
+        rule = dec.args[0].value
+        methods = [attr.upper()] if attr != "route" else ["GET"]
+        for kw in dec.keywords:
+            if kw.arg == "methods" and isinstance(kw.value, (ast.List, ast.Tuple, ast.Set)):
+                methods = [e.value.upper() for e in kw.value.elts
+                           if isinstance(e, ast.Constant) and isinstance(e.value, str)]
+        routes.extend(f"{m} {rule}" for m in methods)
+    return routes
+
+def extract_symbols(rel: str, tree: ast.Module) -> List[Symbol]:
+    symbols = []
+
+    def visit(nodes, parent: Optional[Symbol]):
+        for node in nodes:
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                continue
+            is_class = isinstance(node, ast.ClassDef)
+            kind = "class" if is_class else ("method" if parent and parent.kind == "class" else "function")
+            sym = Symbol(
+                name=f"{parent.name}.{node.name}" if parent else node.name,
+                kind=kind,
+                path=rel,
+                start=min([node.lineno] + [d.lineno for d in node.decorator_list]),
+                end=node.end_lineno,
+                parent=parent.name if parent else None,
+                routes=[] if is_class else _routes(node),
+            )
+            symbols.append(sym)
+            if is_class:
+                visit(node.body, sym)
+
+    visit(tree.body, None)
+    return symbols
+
+# -----------------------
+# Per-project index
+# -----------------------
+_FRAME = re.compile(r"^\s*([^\s:][^:]*\.py):(\d+)")
+_CLIENT_CALL = re.compile(r"\bclient\.(get|post|put|patch|delete)\(\s*f?['\"]([^'\"?{]+)")
+
+class SymbolIndex:
+    """Classes, functions, methods and routes of one project, cached on disk.
+
+    Only files whose mtime or size changed are re-parsed on refresh().
+    """
+
+    def __init__(self, project: Path):
+        self.project = project
+        digest = hashlib.sha1(str(project.resolve()).encode("utf-8")).hexdigest()[:10]
+        self.cache_path = SYMBOL_INDEX_DIR / f"{project.name}-{digest}.json"
+        self.files: Dict[str, dict] = {}
+        self.by_name: Dict[str, List[Symbol]] = {}
+        self.routes: Dict[str, Symbol] = {}
+        self._lines: Dict[str, tuple] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        for rel, entry in data.get("files", {}).items():
+            entry["sig"] = tuple(entry["sig"])
+            entry["symbols"] = [Symbol(**s) for s in entry["symbols"]]
+            self.files[rel] = entry
+        self._rebuild_lookups()
+
+    def _save(self):
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        files = {rel: {**entry, "symbols": [asdict(s) for s in entry["symbols"]]} for rel, entry in self.files.items()}
+        tmp = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"version": INDEX_VERSION, "files": files}), encoding="utf-8")
+        os.replace(tmp, self.cache_path)
+
+    def _rebuild_lookups(self):
+        self.by_name, self.routes = {}, {}
+        for entry in self.files.values():
+            for sym in entry["symbols"]:
+                self.by_name.setdefault(sym.name, []).append(sym)
+                short = sym.name.rsplit(".", 1)[-1]
+                if short != sym.name:
+                    self.by_name.setdefault(short, []).append(sym)
+                for route in sym.routes:
+                    self.routes[route] = sym
+
+    def refresh(self, files: List[Path]) -> "SymbolIndex":
+        seen, dirty = set(), False
+        for path in files:
+            if path.suffix != ".py":
+                continue
+            rel = str(path.relative_to(self.project))
+            seen.add(rel)
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            sig = (st.st_mtime_ns, st.st_size)
+            if rel in self.files and self.files[rel]["sig"] == sig:
+                continue
+            try:
+                tree = ast.parse(get_workspace(self.project).read(path), filename=str(path))
+                symbols = extract_symbols(rel, tree)
+            except SyntaxError:
+                symbols = []
+            self.files[rel] = {"sig": sig, "symbols": symbols, "imports": module_imports(self.project, path)}
+            self._lines.pop(rel, None)
+            dirty = True
+        for rel in set(self.files) - seen:
+            del self.files[rel]
+            self._lines.pop(rel, None)
+            dirty = True
+        if dirty:
+            self._rebuild_lookups()
+            self._save()
+        return self
+
+    def symbols_in(self, rel: str) -> List[Symbol]:
+        entry = self.files.get(rel)
+        return entry["symbols"] if entry else []
+
+    def imports_of(self, rel: str) -> List[str]:
+        entry = self.files.get(rel)
+        return entry["imports"] if entry else []
+
+    def lookup(self, name: str) -> List[Symbol]:
+        return self.by_name.get(name, [])
+
+    def symbol_at(self, rel: str, line: int) -> Optional[Symbol]:
+        # Innermost symbol whose span contains the line.
+        best = None
+        for sym in self.symbols_in(rel):
+            if sym.start <= line <= sym.end and (best is None or sym.start >= best.start):
+                best = sym
+        return best
+
+    def lines(self, rel: str) -> List[str]:
+        entry = self.files.get(rel)
+        cached = self._lines.get(rel)
+        if cached is None or (entry and cached[0] != entry["sig"]):
+            text = get_workspace(self.project).read(self.project / rel)
+            cached = self._lines[rel] = (entry["sig"] if entry else None, text.splitlines())
+        return cached[1]
+
+    def body(self, sym: Symbol) -> str:
+        return "\n".join(self.lines(sym.path)[sym.start - 1:sym.end])
+
+    def locate_failure(self, nodeid: str, trace: str) -> List[Symbol]:
+        """Symbols involved in a failing test.
+
+        That is the test itself, the route handlers its test client calls and
+        every project frame in its trace.
+        """
+        found: List[Symbol] = []
+        parts = nodeid.split("::")
+        if len(parts) > 1:
+            qualname = ".".join(p.split("[")[0] for p in parts[1:])
+            found.extend(s for s in self.lookup(qualname) if s.path == parts[0])
+        for test in list(found):
+            for method, rule in _CLIENT_CALL.findall(self.body(test)):
+                handler = self.routes.get(f"{method.upper()} {rule}")
+                if handler and handler not in found:
+                    found.append(handler)
+        for line in trace.splitlines():
+            m = _FRAME.match(line)
+            if not m:
+                continue
+            sym = self.symbol_at(m.group(1), int(m.group(2)))
+            if sym and sym not in found:
+                found.append(sym)
+        return found
+
+_indexes: Dict[Path, SymbolIndex] = {}
+
+def get_symbol_index(project: Path, files: List[Path]) -> SymbolIndex:
+    key = project.resolve()
+    if key not in _indexes:
+        _indexes[key] = SymbolIndex(project)
+    return _indexes[key].refresh(files)
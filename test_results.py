@@ -0,0 +1,121 @@
+# test_results.py
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from compaction import compact
+
+MAX_TRACE_LINES = 30
+MAX_RAW_OUTPUT = 4000
+
+# -----------------------
+# Structured test results
+# -----------------------
+@dataclass
+class TestCase:
+    nodeid: str
+    outcome: str  # "passed", "failed", "error" or "skipped"
+    duration: float = 0.0
+    message: str = ""
+    trace: str = ""
+
+    @property
+    def file(self) -> str:
+        return self.nodeid.split("::")[0]
+
+@dataclass
+class TestRun:
+    output: str
+    exit_code: Optional[int] = None
+    cases: List[TestCase] = field(default_factory=list)
+    duration: float = 0.0
+    timed_out: bool = False
+    output_bytes: int = 0  # size of the raw output; `output` itself is compacted
+
+    @property
+    def passed(self) -> bool:
+        if self.timed_out or self.exit_code != 0:
+            return False
+        return not self.failures
+
+    @property
+    def failures(self) -> List[TestCase]:
+        return [c for c in self.cases if c.outcome in ("failed", "error")]
+
+    def counts(self) -> Dict[str, int]:
+        counts = {"passed": 0, "failed": 0, "error": 0, "skipped": 0}
+        for case in self.cases:
+            counts[case.outcome] += 1
+        return counts
+
+    def failed_files(self) -> List[str]:
+        return sorted({c.file for c in self.failures})
+
+    def summary(self) -> str:
+        if self.timed_out:
+            return "⏳ Tests timed out."
+        if not self.cases:
+            return f"no test results recorded (exit code {self.exit_code})"
+        counts = ", ".join(f"{n} {k}" for k, n in self.counts().items() if n)
+        return f"{counts} in {self.duration:.2f}s (exit code {self.exit_code})"
+
+    def for_prompt(self) -> str:
+        lines = [self.summary()]
+        for case in self.failures:
+            lines.append(f"{case.outcome.upper()} {case.nodeid}: {case.message}".rstrip(": "))
+            if case.trace:
+                lines.extend("    " + line for line in case.trace.splitlines())
+        if not self.cases or (not self.passed and not self.failures):
+            # Nothing structured to show (collection errors, npm test, a crash):
+            # fall back to the tail of the console output.
+            lines.append(self.output[-MAX_RAW_OUTPUT:])
+        return "\n".join(lines)
+
+    def __str__(self) -> str:
+        return self.for_prompt()
+
+def trim_trace(text: str, max_lines: int = MAX_TRACE_LINES) -> str:
+    lines = text.strip("\n").splitlines()
+    if len(lines) <= max_lines:
+        return "\n".join(lines)
+    head = 5
+    tail = max_lines - head
+    return "\n".join(lines[:head] + [f"... ({len(lines) - max_lines} lines omitted) ..."] + lines[-tail:])
+
+def _nodeid(project: Optional[Path], classname: str, name: str) -> str:
+    # xunit2 reports only carry a dotted classname ("tests.test_logs" or
+    # "tests.test_logs.TestClass"); map it back to a pytest-style node id.
+    parts = classname.split(".") if classname else []
+    if project is not None:
+        for i in range(len(parts), 0, -1):
+            candidate = "/".join(parts[:i]) + ".py"
+            if (project / candidate).is_file():
+                return "::".join([candidate, *parts[i:], name])
+    return "::".join([classname, name]) if classname else name
+
+def parse_junit(paths: List[Path], project: Optional[Path] = None) -> List[TestCase]:
+    cases = []
+    for path in paths:
+        try:
+            root = ET.parse(path).getroot()
+        except (OSError, ET.ParseError):
+            continue
+        for tc in root.iter("testcase"):
+            outcome, message, trace = "passed", "", ""
+            for child in tc:
+                if child.tag in ("failure", "error", "skipped"):
+                    outcome = {"failure": "failed", "error": "error", "skipped": "skipped"}[child.tag]
+                    message = (child.get("message") or "").strip().splitlines()[0:1]
+                    message = message[0] if message else ""
+                    # The runner's output already counted these bytes in the compaction totals.
+                    trace = trim_trace(compact(child.text or "", record=False))
+                    break
+            cases.append(TestCase(
+                nodeid=_nodeid(project, tc.get("classname", ""), tc.get("name", "")),
+                outcome=outcome,
+                duration=float(tc.get("time") or 0.0),
+                message=message,
+                trace=trace if outcome != "skipped" else "",
+            ))
+    return cases
@@ -0,0 +1,191 @@
+# test_worker.py
+import os
+import sys
+import time
+import atexit
+import shutil
+import secrets
+import tempfile
+import threading
+import subprocess
+import contextlib
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from streaming import BoundedWriter
+
+# Long-lived pytest process per project. Third-party imports (Flask,
+# SQLAlchemy, pydantic, ...) stay loaded between runs; project modules are
+# dropped from sys.modules and re-imported by the next run.
+
+STARTUP_TIMEOUT = 30
+AUTHKEY_ENV = "TEST_WORKER_AUTHKEY"
+
+# -----------------------
+# Worker side
+# -----------------------
+def _project_modules(project: Path) -> Dict[str, Path]:
+    modules = {}
+    for name, mod in list(sys.modules.items()):
+        file = getattr(mod, "__file__", None)
+        if not file:
+            continue
+        path = Path(file).resolve()
+        if project in path.parents and "site-packages" not in path.parts:
+            modules[name] = path
+    return modules
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+class WorkerState:
+    def __init__(self, project: Path):
+        self.project = project
+        self.mtimes: Dict[str, Optional[int]] = {}
+
+    def snapshot(self):
+        self.mtimes = {name: _mtime(path) for name, path in _project_modules(self.project).items()}
+
+    def purge_project_modules(self) -> List[str]:
+        # Every project module is dropped, not just the changed ones: project
+        # code keeps state in module globals (flask-hard's metrics counters)
+        # that would otherwise leak into the next run. Re-importing the
+        # project itself is cheap; the third-party imports stay warm.
+        loaded = _project_modules(self.project)
+        changed = sorted(name for name, path in loaded.items() if self.mtimes.get(name) != _mtime(path))
+        for name in loaded:
+            sys.modules.pop(name, None)
+        return changed
+
+    def run(self, args: List[str]) -> Dict[str, Any]:
+        import pytest
+        changed = self.purge_project_modules()
+        threads_before = set(threading.enumerate())
+        # Bounded like a cold run's output, so a runaway suite cannot fill
+        # this process or the pipe back to the agent.
+        out = BoundedWriter()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+            exit_code = int(pytest.main(["-p", "no:cacheprovider", *args]))
+        duration = time.perf_counter() - start
+        self.snapshot()
+        unsafe = None
+        # Threads started by the tests keep running against the old modules.
+        leaked = [t for t in threading.enumerate() if t not in threads_before and t.is_alive()]
+        if leaked:
+            unsafe = f"tests left {len(leaked)} thread(s) running"
+        elif exit_code in (pytest.ExitCode.INTERNAL_ERROR, pytest.ExitCode.INTERRUPTED):
+            unsafe = f"pytest exited with {pytest.ExitCode(exit_code).name}"
+        return {"exit_code": exit_code, "output": out.getvalue(), "output_bytes": out.bytes_written,
+                "duration": duration,
+                "changed": changed, "unsafe": unsafe}
+
+def serve(address: str):
+    project = Path.cwd().resolve()
+    sys.path.insert(0, str(project))
+    sys.path.insert(1, str(Path(__file__).resolve().parent))
+    state = WorkerState(project)
+    # Warm up: collecting imports the app and every third-party dependency.
+    state.run(["--collect-only", "-q"])
+    authkey = bytes.fromhex(os.environ.pop(AUTHKEY_ENV))
+    with Listener(address, authkey=authkey) as listener, listener.accept() as conn:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            if request.get("cmd") == "shutdown":
+                break
+            try:
+                conn.send(state.run(request.get("args", [])))
+            except BaseException as e:
+                conn.send({"exit_code": -1, "output": "", "duration": 0.0, "changed": [],
+                           "unsafe": f"worker error: {e!r}"})
+
+# -----------------------
+# Client side
+# -----------------------
+class WarmWorker:
+    def __init__(self, project: Path):
+        self.project = project
+        self.tmpdir = tempfile.mkdtemp(prefix="test-worker-")
+        self.address = os.path.join(self.tmpdir, "worker.sock")
+        authkey = secrets.token_bytes(16)
+        env = dict(os.environ, **{AUTHKEY_ENV: authkey.hex()})
+        self.proc = subprocess.Popen([sys.executable, str(Path(__file__).resolve()), self.address],
+                                     cwd=project, env=env,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.conn = self._connect(authkey)
+
+    def _connect(self, authkey: bytes):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"test worker exited with {self.proc.returncode}")
+            try:
+                return Client(self.address, authkey=authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                time.sleep(0.05)
+        raise RuntimeError("test worker did not start in time")
+
+    def run(self, args: List[str], timeout: float) -> Dict[str, Any]:
+        self.conn.send({"cmd": "run", "args": list(args)})
+        if not self.conn.poll(timeout):
+            raise TimeoutError
+        return self.conn.recv()
+
+    def close(self):
+        try:
+            self.conn.send({"cmd": "shutdown"})
+            self.conn.close()
+            self.proc.wait(timeout=5)
+        except Exception:
+            self.proc.kill()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+_workers: Dict[Path, WarmWorker] = {}
+
+def run_warm(project: Path, args: List[str], timeout: float) -> Optional[Dict[str, Any]]:
+    """Run pytest in the project's warm worker.
+
+    Returns None when the worker cannot be used and the caller should fall
+    back to a cold subprocess. Raises TimeoutError when the run timed out.
+    """
+    key = project.resolve()
+    try:
+        worker = _workers.get(key)
+        if worker is None or worker.proc.poll() is not None:
+            worker = _workers[key] = WarmWorker(key)
+        result = worker.run(args, timeout)
+    except TimeoutError:
+        shutdown(key)
+        raise
+    except Exception as e:
+        print(f"⚠️ Warm test worker unavailable for {project.name} ({e}), using a cold run.")
+        shutdown(key)
+        return None
+    if result["exit_code"] == -1:
+        print(f"⚠️ Warm test worker failed for {project.name}: {result['unsafe']}")
+        shutdown(key)
+        return None
+    if result["unsafe"]:
+        # The result itself is fine, but the next run gets a fresh worker.
+        print(f"♻️ Restarting test worker for {project.name}: {result['unsafe']}")
+        shutdown(key)
+    return result
+
+def shutdown(project: Optional[Path] = None):
+    keys = [project.resolve()] if project else list(_workers)
+    for key in keys:
+        worker = _workers.pop(key, None)
+        if worker:
+            worker.close()
+
+atexit.register(shutdown)
+
+if __name__ == "__main__":
+    serve(sys.argv[1])
@@ -0,0 +1,143 @@
+# tracing.py
+import os
+import json
+import time
+import inspect
+import functools
+import threading
+import contextlib
+import contextvars
+from pathlib import Path
+from typing import Any, Dict, List
+
+# -----------------------
+# Config
+# -----------------------
+TRACE_FILE = Path(os.getenv("AGENT_TRACE_FILE", ".agent_runs/trace.jsonl"))
+TRACE_ENABLED = os.getenv("AGENT_TRACE", "1") != "0"
+# Child processes started with --jobs inherit the parent's run id, so one
+# run's spans can be summarized together.
+RUN_ID = os.environ.setdefault("AGENT_RUN_ID", f"run_{int(time.time())}_{os.getpid()}")
+
+_project: contextvars.ContextVar = contextvars.ContextVar("trace_project", default=None)
+_iteration: contextvars.ContextVar = contextvars.ContextVar("trace_iteration", default=None)
+_node: contextvars.ContextVar = contextvars.ContextVar("trace_node", default=None)
+_write_lock = threading.Lock()
+
+# -----------------------
+# Spans
+# -----------------------
+def set_context(project: str = None, iteration: int = None):
+    if project is not None:
+        _project.set(project)
+    if iteration is not None:
+        _iteration.set(iteration)
+
+def _emit(record: Dict[str, Any]):
+    line = json.dumps(record, default=str) + "\n"
+    with _write_lock:
+        TRACE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line)
+
+@contextlib.contextmanager
+def span(kind: str, name: str, **attrs):
+    """Time a block and append it to the trace; callers can add attributes to the yielded dict."""
+    if not TRACE_ENABLED:
+        yield attrs
+        return
+    start = time.perf_counter()
+    ts = time.time()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record = {
+            "ts": ts,
+            "run_id": RUN_ID,
+            "project": _project.get(),
+            "iteration": _iteration.get(),
+            "node": _node.get() if kind != "node" else name,
+            "kind": kind,
+            "name": name,
+            "wall": round(time.perf_counter() - start, 4),
+            **attrs,
+        }
+        if error:
+            record["error"] = error
+        _emit(record)
+
+def traced_node(name: str, fn):
+    # Graph nodes may be sync or async; keep the wrapper the same kind.
+    # The iteration number travels in the graph state, so it is picked up
+    # here rather than from the caller's context.
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(state):
+            tokens = (_node.set(name), _iteration.set(state.get("iteration")))
+            try:
+                with span("node", name):
+                    return await fn(state)
+            finally:
+                _node.reset(tokens[0])
+                _iteration.reset(tokens[1])
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(state):
+        tokens = (_node.set(name), _iteration.set(state.get("iteration")))
+        try:
+            with span("node", name):
+                return fn(state)
+        finally:
+            _node.reset(tokens[0])
+            _iteration.reset(tokens[1])
+    return wrapper
+
+# -----------------------
+# Summary
+# -----------------------
+def load_spans(run_id: str = RUN_ID) -> List[Dict[str, Any]]:
+    spans = []
+    try:
+        with open(TRACE_FILE, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("run_id") == run_id:
+                    spans.append(record)
+    except OSError:
+        pass
+    return spans
+
+def summarize(spans: List[Dict[str, Any]]) -> str:
+    rows: Dict[tuple, Dict[str, float]] = {}
+    for s in spans:
+        key = (s.get("project") or "-", s.get("iteration") or 0)
+        row = rows.setdefault(key, {"nodes": 0.0, "llm": 0.0, "calls": 0, "hits": 0, "prompt": 0,
+                                    "completion": 0, "tests": 0.0, "runs": 0, "out_bytes": 0})
+        if s["kind"] == "node":
+            row["nodes"] += s["wall"]
+        elif s["kind"] == "llm":
+            row["llm"] += s["wall"]
+            row["calls"] += 1
+            row["hits"] += 1 if s.get("cache_hit") else 0
+            row["prompt"] += s.get("prompt_tokens") or 0
+            row["completion"] += s.get("completion_tokens") or 0
+        elif s["kind"] == "subprocess":
+            row["tests"] += s["wall"]
+            row["runs"] += 1
+            row["out_bytes"] += s.get("output_bytes") or 0
+    header = (f"{'project':<22}{'iter':>5}{'nodes s':>9}{'llm s':>8}{'calls':>6}{'hits':>5}"
+              f"{'prompt tok':>11}{'compl tok':>10}{'tests s':>9}{'runs':>5}{'out KB':>8}")
+    lines = [header, "-" * len(header)]
+    for (project, iteration), r in sorted(rows.items(), key=lambda kv: (kv[0][0], kv[0][1])):
+        lines.append(f"{project:<22}{iteration:>5}{r['nodes']:>9.1f}{r['llm']:>8.1f}{r['calls']:>6}{r['hits']:>5}"
+                     f"{r['prompt']:>11}{r['completion']:>10}{r['tests']:>9.1f}{r['runs']:>5}"
+                     f"{r['out_bytes'] / 1024:>8.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,130 @@
+# workspace.py
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from discovery import Stamp, stamp, walk
+
+# -----------------------
+# Config
+# -----------------------
+# Scratch copies made for fix candidates get a workspace too; keep only the most recent ones.
+MAX_WORKSPACES = int(os.getenv("MAX_WORKSPACES", 16))
+SOURCE_SUFFIXES = {"python": ".py", "node": ".js", "java": ".java"}
+
+class Workspace:
+    """Directory listing, language and file contents of one project.
+
+    Shared by every node, so an unchanged project is walked and read once.
+    The listing is revalidated against the inode and mtime of every directory
+    walked and .gitignore read, and contents against each file's inode, mtime
+    and size. apply_fixes also calls invalidate() after writing.
+    """
+
+    def __init__(self, project: Path):
+        self.project = project
+        self._stamps: Dict[Path, Stamp] = {}
+        self._files: Optional[List[Path]] = None
+        self._language: Optional[Tuple[Stamp, str]] = None
+        self._contents: Dict[Path, Tuple[Stamp, str]] = {}
+        self.stats = {"walks": 0, "reads": 0, "hits": 0, "skipped_large": 0}
+
+    def language(self) -> str:
+        # Decided by top-level entries only, so the root directory's stamp is enough.
+        try:
+            current = stamp(self.project.stat())
+        except OSError:
+            return "unknown"
+        if self._language is None or self._language[0] != current:
+            self._language = (current, self._detect_language())
+        return self._language[1]
+
+    def _detect_language(self) -> str:
+        if (self.project / "package.json").exists():
+            return "node"
+        elif (self.project / "pom.xml").exists():
+            return "java"
+        elif any(self.project.glob("*.py")) or (self.project / "requirements.txt").exists():
+            return "python"
+        else:
+            return "unknown"
+
+    def _listing_valid(self) -> bool:
+        if self._files is None:
+            return False
+        for path, known in self._stamps.items():
+            try:
+                if stamp(path.stat()) != known:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def files(self) -> List[Path]:
+        """Source files of every known language, relative to the project root.
+
+        Comes from discovery.walk, so ignored, vendored and oversized files are left out.
+        """
+        if not self._listing_valid():
+            self.stats["walks"] += 1
+            listing = walk(self.project, set(SOURCE_SUFFIXES.values()))
+            self._files, self._stamps = listing.files, listing.stamps
+            self.stats["skipped_large"] = len(listing.skipped_large)
+        return list(self._files)
+
+    def source_files(self) -> List[Path]:
+        suffix = SOURCE_SUFFIXES.get(self.language())
+        return [f for f in self.files() if f.suffix == suffix] if suffix else []
+
+    def read(self, path: Path) -> str:
+        path = Path(os.path.abspath(path))
+        current = stamp(path.stat())
+        cached = self._contents.get(path)
+        if cached is not None and cached[0] == current:
+            self.stats["hits"] += 1
+            return cached[1]
+        self.stats["reads"] += 1
+        text = path.read_text(encoding="utf-8", errors="replace")
+        self._contents[path] = (current, text)
+        return text
+
+    def invalidate(self, paths: Iterable[Path] = None):
+        """Forget the listing and language, and the contents of `paths` (all when None)."""
+        self._files, self._stamps, self._language = None, {}, None
+        if paths is None:
+            self._contents.clear()
+        else:
+            for path in paths:
+                self._contents.pop(Path(os.path.abspath(path)), None)
+
+_workspaces: "OrderedDict[Path, Workspace]" = OrderedDict()
+_lock = threading.Lock()
+
+def get_workspace(project: Path) -> Workspace:
+    key = Path(project).resolve()
+    with _lock:
+        ws = _workspaces.get(key)
+        if ws is None:
+            ws = _workspaces[key] = Workspace(key)
+            while len(_workspaces) > MAX_WORKSPACES:
+                _workspaces.popitem(last=False)
+        _workspaces.move_to_end(key)
+        return ws
+
+def invalidate(project: Path, paths: Iterable[Path] = None):
+    with _lock:
+        ws = _workspaces.get(Path(project).resolve())
+    if ws is not None:
+        ws.invalidate(paths)
+
+def totals() -> Dict[str, int]:
+    with _lock:
+        stats = [ws.stats for ws in _workspaces.values()]
+    return {key: sum(s[key] for s in stats) for key in ("walks", "reads", "hits")}
+
+def summary() -> str:
+    t = totals()
+    return (f"Workspace cache: {t['hits']} of {t['reads'] + t['hits']} file reads served from memory, "
+            f"{t['walks']} directory walks")